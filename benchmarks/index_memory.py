@@ -0,0 +1,100 @@
+# GAEPyPi, private package index on Google App Engine
+# Copyright (C) 2017  ML2Grow BVBA
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Memory benchmark of a full package index built from a synthetic catalog.
+
+Measures the memory held by the PackageIndex/Package objects (on top of the catalog they are built from)
+and compares it to the previous representation: a set subclass of Package objects with an instance dict
+and a set of filenames each.
+
+Usage: python benchmarks/index_memory.py [number of files]
+"""
+
+from __future__ import print_function
+
+import gc
+import sys
+import time
+
+from gaepypi import Catalog, PackageIndex
+
+FILES_PER_VERSION = 2
+VERSIONS_PER_PACKAGE = 50
+
+
+class LegacyPackage(object):
+    def __init__(self, storage, name, version, files):
+        self.storage = storage
+        self.name = name.lower()
+        self.version = version
+        self._files = set(files)
+
+
+class LegacyPackageIndex(set):
+    def __init__(self, storage, name, versions):
+        super(LegacyPackageIndex, self).__init__(LegacyPackage(storage, name, v, files) for v, files in versions.items())
+        self.storage = storage
+        self.name = name
+
+
+def synthetic_catalog(n_files):
+    packages = {}
+    for i in range(n_files // (FILES_PER_VERSION * VERSIONS_PER_PACKAGE)):
+        name = 'package-{0}'.format(i)
+        packages[name] = dict(('1.{0}.0'.format(v),
+                               dict(('{0}-1.{1}.0-{2}.whl'.format(name, v, f), {}) for f in range(FILES_PER_VERSION)))
+                              for v in range(VERSIONS_PER_PACKAGE))
+    return Catalog(None, packages)
+
+
+def reachable(objects, exclude):
+    """
+    :return: dictionary of all objects reachable from the given objects (by id), apart from excluded ones
+    """
+    seen = {}
+    pending = list(objects)
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or id(obj) in exclude or isinstance(obj, type):
+            continue
+        seen[id(obj)] = obj
+        pending.extend(gc.get_referents(obj))
+    return seen
+
+
+def measure(build, catalog):
+    exclude = reachable([catalog, catalog.storage], {})
+    start = time.time()
+    indices = build(catalog)
+    elapsed = time.time() - start
+    size = sum(sys.getsizeof(obj) for obj in reachable([indices], exclude).values())
+    return size, elapsed
+
+
+def main(n_files):
+    catalog = synthetic_catalog(n_files)
+    results = [('legacy', measure(lambda c: [LegacyPackageIndex(None, name, versions)
+                                             for name, versions in c.items()], catalog)),
+               ('current', measure(lambda c: PackageIndex.get_all(None, catalog=c), catalog))]
+    print('{0} files, {1} versions, {2} packages'.format(n_files, n_files // FILES_PER_VERSION, len(catalog)))
+    for label, (size, elapsed) in results:
+        print('{0:8s} {1:8.2f} MB {2:8.3f} s'.format(label, size / 1024.0 / 1024.0, elapsed))
+    print('reduction {0:.0%}'.format(1 - float(results[1][1][0]) / results[0][1][0]))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,136 @@
+# GAEPyPi, private package index on Google App Engine
+# Copyright (C) 2017  ML2Grow BVBA
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Start up benchmark: measures the time to import the application and to serve the first requests in fresh
+processes, as an instance would after a cold start. Requests are served from a local storage (see LocalStorage)
+with the App Engine service stubs of the SDK, which must be on the Python path.
+
+Also compares the first rendering of every template when compiled on first use and when loaded from modules
+compiled ahead (see gaepypi/templates.py).
+
+Usage: python benchmarks/startup.py [number of runs]
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import tempfile
+import subprocess
+
+PATHS = ['/pypi/', '/simple/dummy/', '/packages/dummy/0.1']
+
+STARTUP = """
+import os, sys, time, json, base64
+start = time.time()
+import gaepypi
+imported = time.time()
+from google.appengine.ext import testbed
+bed = testbed.Testbed()
+bed.activate()
+bed.init_memcache_stub()
+import webob
+timings = {'import': imported - start, 'cloudstorage imported': 'cloudstorage' in sys.modules,
+           'compiled templates': os.path.exists(os.path.join(gaepypi.templates.COMPILED_PATH, 'manifest.json'))}
+auth = 'Basic ' + base64.b64encode(b'user:password').decode('ascii')
+for path in json.loads(sys.argv[1]):
+    start = time.time()
+    response = webob.Request.blank(path, headers={'Authorization': auth}).get_response(gaepypi.app)
+    assert response.status_int == 200, response.status
+    timings[path] = time.time() - start
+print(json.dumps(timings))
+"""
+
+TEMPLATES = """
+import sys, time, json
+import jinja2
+from gaepypi import templates
+timings = {}
+environment = templates.create_environment(sys.argv[1] or None)
+files = [{'name': 'dummy', 'version': '0.1', 'filename': 'dummy-0.1.tar.gz', 'sha256': ''}]
+start = time.time()
+for name in environment.list_templates():
+    environment.get_template(name).render(files=files, indices=[], packages=[])
+print(json.dumps({'templates': time.time() - start}))
+"""
+
+SEED = """
+import sys
+from gaepypi import LocalStorage, Catalog, StaticPages
+storage = LocalStorage(sys.argv[1])
+StaticPages(storage).rebuild(Catalog.rebuild(storage))
+"""
+
+
+def seed(root, env):
+    """
+    Create a storage holding a single package (with its catalog and static pages, as after a rebuild), and the
+    configuration of a single account
+    """
+    os.makedirs(os.path.join(root, 'storage', 'packages', 'dummy', '0.1'))
+    with open(os.path.join(root, 'storage', 'packages', 'dummy', '0.1', 'dummy-0.1.tar.gz'), 'wb') as f:
+        f.write(b'content')
+    with open(os.path.join(root, 'config.json'), 'w') as f:
+        json.dump({'accounts': [{'username': 'user', 'password': hashlib.sha1(b'password').hexdigest()}]}, f)
+    subprocess.check_call([sys.executable, '-c', SEED, env['STORAGE_ROOT']], cwd=root, env=env)
+
+
+def run(code, argument, cwd, env):
+    output = subprocess.check_output([sys.executable, '-c', code, argument], cwd=cwd, env=env)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def report(label, runs):
+    print(label)
+    for key in sorted(runs[0]):
+        if isinstance(runs[0][key], bool):
+            print('  {0:24s} {1}'.format(key, runs[0][key]))
+        else:
+            print('  {0:24s} {1:8.1f} ms'.format(key, 1000 * median([run[key] for run in runs])))
+
+
+def main(n_runs):
+    root = tempfile.mkdtemp()
+    try:
+        env = dict(os.environ, STORAGE_ROOT=os.path.join(root, 'storage'),
+                   PYTHONPATH=os.pathsep.join([os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                               os.environ.get('PYTHONPATH', '')]))
+        seed(root, env)
+        report('cold start ({0} runs, median)'.format(n_runs),
+               [run(STARTUP, json.dumps(PATHS), root, env) for _ in range(n_runs)])
+
+        compiled = os.path.join(root, 'templates_compiled')
+        subprocess.check_call([sys.executable, '-c', 'import sys; from gaepypi.templates import compile_templates; '
+                                                     'compile_templates(sys.argv[1])', compiled], cwd=root, env=env)
+        report('first rendering of all templates, compiled on first use',
+               [run(TEMPLATES, '', root, env) for _ in range(n_runs)])
+        report('first rendering of all templates, compiled ahead',
+               [run(TEMPLATES, compiled, root, env) for _ in range(n_runs)])
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -14,9 +14,12 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from .exceptions import GAEPyPIError
+from .exceptions import GAEPyPIError, RangeNotSatisfiable, NotFoundError
+from .catalog import Catalog
+from .pagecache import PageCache
 from .package import Package, PackageIndex
-from .storage import Storage, GCStorage
+from .staticpages import StaticPages
+from .storage import Storage, GCStorage, LocalStorage, CachingStorage, DiskCachingStorage
 from .wsgi import app
 
 from ._version import __version__
\ No newline at end of file
@@ -0,0 +1,81 @@
+# GAEPyPi, private package index on Google App Engine
+# Copyright (C) 2017  ML2Grow BVBA
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import threading
+import importlib
+
+_lock = threading.RLock()
+
+
+class LazyModule(object):
+    """
+    Module imported on first attribute access. Importing the client libraries of App Engine (cloudstorage in
+    particular, which pulls in ndb) is a large part of the start up of an instance, while many requests are
+    served without them (e.g., listings from the page cache).
+    """
+
+    def __init__(self, name, setup=None):
+        """
+        :param name: absolute name of the module
+        :param setup: function called with the module once it is imported
+        """
+        self._lazy_name = name
+        self._lazy_setup = setup
+        self._lazy_module = None
+
+    def _load(self):
+        if self._lazy_module is None:
+            with _lock:
+                if self._lazy_module is None:
+                    module = importlib.import_module(self._lazy_name)
+                    if self._lazy_setup is not None:
+                        self._lazy_setup(module)
+                    self._lazy_module = module
+        return self._lazy_module
+
+    def __getattr__(self, attr):
+        if attr.startswith('_lazy_'):
+            raise AttributeError(attr)
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return '<lazy module {0!r}>'.format(self._lazy_name)
+
+
+def available(module):
+    """
+    :param module: LazyModule object
+    :return: True if the module can be imported (e.g., the App Engine SDK is installed)
+    """
+    try:
+        module._load()
+    except ImportError:
+        return False
+    return True
+
+
+def _set_retry_params(module):
+    module.set_default_retry_params(module.RetryParams(initial_delay=0.2,
+                                                       max_delay=5.0,
+                                                       backoff_factor=2,
+                                                       max_retry_period=15))
+
+
+cloudstorage = LazyModule('cloudstorage', setup=_set_retry_params)
+app_identity = LazyModule('google.appengine.api.app_identity')
+taskqueue = LazyModule('google.appengine.api.taskqueue')
+memcache = LazyModule('google.appengine.api.memcache')
@@ -0,0 +1,236 @@
+# GAEPyPi, private package index on Google App Engine
+# Copyright (C) 2017  ML2Grow BVBA
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import time
+import errno
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def _close(obj):
+    close = getattr(obj, 'close', None)
+    if close is not None:
+        close()
+
+
+class LRUCache(object):
+    """
+    Thread-safe, size-bounded least recently used cache with optional expiry of entries.
+    Hits and misses are counted for monitoring.
+    """
+
+    def __init__(self, max_size, ttl=None, clock=time.time):
+        """
+        :param max_size: maximum number of entries, the least recently used entry is evicted beyond
+        :param ttl: time to live of an entry in seconds, no expiry if None
+        :param clock: function returning the current time in seconds
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """
+        :return: cached value for key, default if absent or expired
+        """
+        with self._lock:
+            try:
+                value, expires = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires <= self._clock():
+                self.misses += 1
+                return default
+            self._entries[key] = (value, expires)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, self._clock() + self.ttl if self.ttl is not None else None)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        :return: dictionary with the number of entries, hits and misses
+        """
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class DiskCache(object):
+    """
+    Thread-safe least recently used cache of byte strings stored as files in a local directory, bounded by the
+    total size of the files. Entries are written to a temporary file and renamed into place, so they are never
+    read partially. Files present in the directory on creation are adopted, oldest first.
+    Hits, misses and evictions are counted for monitoring.
+    """
+
+    def __init__(self, directory, max_bytes):
+        """
+        :param directory: directory holding the cached files, created if needed. It should not be used otherwise.
+        :param max_bytes: maximum total size of the cached files, the least recently used entries are evicted beyond
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        existing = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.startswith('.'):
+                os.remove(path)
+            else:
+                existing.append((os.stat(path), name))
+        for stat, name in sorted(existing, key=lambda item: item[0].st_mtime):
+            self._entries[name] = stat.st_size
+            self._bytes += stat.st_size
+        with self._lock:
+            self._evict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _name(key):
+        return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                # Readers holding the file open keep reading the unlinked file
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def open(self, key, offset=0):
+        """
+        :param offset: number of bytes to skip at the start of the entry
+        :return: file object reading the cached entry, None if absent
+        """
+        name = self._name(key)
+        with self._lock:
+            if name not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                file_obj = open(os.path.join(self.directory, name), 'rb')
+            except IOError:
+                self._bytes -= self._entries.pop(name)
+                self.misses += 1
+                return None
+            self._entries[name] = self._entries.pop(name)
+            self.hits += 1
+        file_obj.seek(offset)
+        return file_obj
+
+    def _store(self, name, temp_path, size):
+        with self._lock:
+            os.rename(temp_path, os.path.join(self.directory, name))
+            self._bytes += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+            self._evict()
+
+    def put(self, key, chunks):
+        """
+        Store an entry, replacing any previous value. Entries larger than the cache are not stored.
+        :param chunks: iterable of byte strings, the content of the entry. Closed once consumed (if it has a close
+                       method), also when the entry turns out too large.
+        :return: True if the entry was stored
+        """
+        name = self._name(key)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.')
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        return False
+                    temp_file.write(chunk)
+            self._store(name, temp_path, size)
+            return True
+        finally:
+            _close(chunks)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def fill(self, key, chunks):
+        """
+        Store an entry while passing its content on, e.g. to serve a file while it is being cached. The entry is
+        stored once all chunks were consumed, entries larger than the cache or abandoned early are not stored.
+        :param chunks: iterable of byte strings, the content of the entry. Closed when the returned iterator is
+                       exhausted or closed.
+        :return: iterator over the chunks
+        """
+        name = self._name(key)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.')
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size <= self.max_bytes:
+                        temp_file.write(chunk)
+                    yield chunk
+            if size <= self.max_bytes:
+                self._store(name, temp_path, size)
+        finally:
+            _close(chunks)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def stats(self):
+        """
+        :return: dictionary with the number of entries, their total size in bytes, hits, misses, evictions and
+                 the hit rate (None before the first lookup)
+        """
+        lookups = self.hits + self.misses
+        return {'size': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hit_rate': float(self.hits) / lookups if lookups else None}
@@ -0,0 +1,77 @@
+# GAEPyPi, private package index on Google App Engine
+# Copyright (C) 2017  ML2Grow BVBA
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import sys
+import threading
+
+import six
+
+
+def _call(func, item, retries, retry_on):
+    attempt = 0
+    while True:
+        try:
+            return func(item)
+        except retry_on:
+            if attempt >= retries:
+                raise
+            attempt += 1
+
+
+def bounded_map(func, items, max_workers, retries=0, retry_on=(Exception,)):
+    """
+    Apply a function to all items, using at most max_workers threads. All threads have finished on return.
+    :param func: function of a single argument
+    :param items: iterable of arguments
+    :param max_workers: maximum number of concurrent calls, calls are made sequentially if 1 or less
+    :param retries: number of times a failing call is repeated before giving up
+    :param retry_on: exception types considered transient, calls failing with other exceptions are not repeated
+    :return: list of results, in the order of the items
+    :raises: the exception of the first item (in order) which failed, remaining items are abandoned
+    """
+    items = list(items)
+    if max_workers <= 1 or len(items) <= 1:
+        return [_call(func, item, retries, retry_on) for item in items]
+
+    results = [None] * len(items)
+    errors = {}
+    pending = iter(range(len(items)))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if errors:
+                    return
+                index = next(pending, None)
+            if index is None:
+                return
+            try:
+                results[index] = _call(func, items[index], retries, retry_on)
+            except Exception:
+                with lock:
+                    errors[index] = sys.exc_info()
+
+    threads = [threading.Thread(target=worker) for _ in range(min(max_workers, len(items)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        six.reraise(*errors[min(errors)])
+    return results
@@ -14,11 +14,24 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import base64
 import json
+import threading
 from functools import wraps
 from webapp2_extras import security
 
+from ._cache import LRUCache
+
+CONFIG_FILE = 'config.json'
+
+# Accounts from the config file keyed by username, reloaded when the file is modified
+_config = {'mtime': None, 'accounts': {}}
+_config_lock = threading.Lock()
+
+# Accounts for recently verified Authorization headers
+_verified = LRUCache(max_size=256, ttl=600)
+
 
 def basic_auth(required_roles=None):
     """
@@ -30,13 +43,10 @@ def basic_auth(required_roles=None):
             if auth_header is None:
                 __basic_login(handler)
             else:
-                parts = base64.b64decode(auth_header.split(' ')[1]).split(':')
-                username = parts[0]
-                password = ':'.join(parts[1:])
-                account = __basic_lookup(username)
+                account = __basic_verify(auth_header)
 
                 # Return 401 Unauthorized if user did not specify credentials or password is mismatched
-                if not account or account["password"] != __basic_hash(password):
+                if not account:
                     return __basic_login(handler)
 
                 # Return 403 Forbidden if user's account does not have any of the required access roles
@@ -60,12 +70,30 @@ def __basic_forbidden(handler):
     handler.response.set_status(403, message="Forbidden")
 
 
-def __basic_lookup(username):
-    with open('config.json') as data_file:
-        config = json.load(data_file)
-    for account in config["accounts"]:
-        if account['username'] == username:
-            return account
+def __basic_verify(auth_header):
+    accounts = __basic_accounts()
+    account = _verified.get(auth_header)
+    if account is None:
+        parts = base64.b64decode(auth_header.split(' ')[1]).split(':')
+        username = parts[0]
+        password = ':'.join(parts[1:])
+        account = accounts.get(username)
+        if not account or account["password"] != __basic_hash(password):
+            return None
+        _verified.set(auth_header, account)
+    return account
+
+
+def __basic_accounts():
+    mtime = os.path.getmtime(CONFIG_FILE)
+    with _config_lock:
+        if _config['mtime'] != mtime:
+            with open(CONFIG_FILE) as data_file:
+                config = json.load(data_file)
+            _config['accounts'] = dict((account['username'], account) for account in config["accounts"])
+            _config['mtime'] = mtime
+            _verified.clear()
+        return _config['accounts']
 
 
 def __basic_hash(password):
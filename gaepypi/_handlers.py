@@ -14,15 +14,88 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from .storage import GCStorage
+from .storage import GCStorage, LocalStorage, CachingStorage, DiskCachingStorage, DEFAULT_BUFFER_SIZE, \
+    DEFAULT_LISTING_CONCURRENCY
 from .package import Package, PackageIndex
-from .exceptions import GAEPyPIError
+from .catalog import Catalog, normalize_name
+from .exceptions import GAEPyPIError, RangeNotSatisfiable, NotFoundError
+from ._http import byte_range, if_range_matches, is_not_modified, http_date, quote_etag, accepts_encoding, \
+    gzip_compress
+from ._version import deployment_id
+from ._cache import LRUCache, DiskCache
+from .pagecache import PageCache
+from .staticpages import StaticPages
+from .maintenance import IndexMaintenance
 
 import os
+import json
+import threading
+import hashlib
 import webapp2
-from cloudstorage import NotFoundError
 from _decorators import basic_auth
-from google.appengine.api import app_identity
+from ._appengine import app_identity
+
+# Storage listings shared by all requests served by this instance
+_listing_cache = LRUCache(max_size=int(os.environ.get('LISTING_CACHE_SIZE', 1024)),
+                          ttl=int(os.environ.get('LISTING_CACHE_TTL', 60)))
+
+# Package files downloaded by this instance, kept on local disk if a directory is configured
+_artifact_cache = None
+if os.environ.get('ARTIFACT_CACHE_DIR'):
+    _artifact_cache = DiskCache(os.environ['ARTIFACT_CACHE_DIR'],
+                                int(os.environ.get('ARTIFACT_CACHE_SIZE', 512 * 1024 * 1024)))
+
+# Storage of the index, created on first use (see _get_storages)
+_storages = None
+_storages_lock = threading.Lock()
+
+# Rendered listings shared by all instances
+_page_cache = PageCache()
+
+# Validity (in seconds) of the signed URLs large downloads are redirected to
+DEFAULT_URL_EXPIRATION = 300
+
+# Media types of the simple repository API (PEP 691), the first one is served if the client has no preference
+SIMPLE_MEDIA_TYPES = ['text/html', 'application/vnd.pypi.simple.v1+html', 'application/vnd.pypi.simple.v1+json',
+                      'application/vnd.pypi.simple.latest+html', 'application/vnd.pypi.simple.latest+json']
+
+
+def _is_segment(*names):
+    """
+    :return: True if all names are valid path segments of the storage (non-empty, no parent or current directory)
+    """
+    return all(name and '/' not in name and name not in ('.', '..') for name in names)
+
+
+def _has_content(upload):
+    """
+    :return: True if the uploaded file is not empty. Only its first byte is read, the file is rewound afterwards.
+    """
+    empty = not upload.file.read(1)
+    upload.file.seek(0)
+    return not empty
+
+
+def _get_storages():
+    """
+    Create the storage of the index once per instance: a directory tree if STORAGE_ROOT is configured, the
+    bucket of the application otherwise (listed as configured by BULK_LISTING and LISTING_CONCURRENCY).
+    :return: tuple of the storage, and the storage wrapped in the listing cache
+    """
+    global _storages
+    with _storages_lock:
+        if _storages is None:
+            if os.environ.get('STORAGE_ROOT'):
+                storage = LocalStorage(os.environ['STORAGE_ROOT'])
+            else:
+                bucket_name = os.environ.get('BUCKET_NAME') or app_identity.get_default_gcs_bucket_name()
+                bulk_listing = os.environ.get('BULK_LISTING', '1').lower() not in ('0', 'false', 'no')
+                concurrency = int(os.environ.get('LISTING_CONCURRENCY', DEFAULT_LISTING_CONCURRENCY))
+                storage = GCStorage(bucket_name, bulk_listing=bulk_listing, max_concurrency=concurrency)
+                if _artifact_cache is not None:
+                    storage = DiskCachingStorage(storage, _artifact_cache)
+            _storages = storage, CachingStorage(storage, _listing_cache)
+        return _storages
 
 
 class BaseHandler(webapp2.RequestHandler):
@@ -30,6 +103,10 @@ class BaseHandler(webapp2.RequestHandler):
     Basic handler class for our GAE webapp2 application
     """
 
+    # Media types of the listing served by this handler, see serve_listing
+    media_types = ['text/html']
+    media_type = 'text/html'
+
     def write_page(self, body):
         self.response.write('<html><body>{}</body></html>'.format(body))
 
@@ -37,9 +114,179 @@ class BaseHandler(webapp2.RequestHandler):
         self.response.set_status(404)
         self.write_page('<h1>Not found</h1>')
 
-    def get_storage(self):
-        bucket_name = os.environ.get('BUCKET_NAME', app_identity.get_default_gcs_bucket_name())
-        return GCStorage(bucket_name)
+    def initialize(self, request, response):
+        super(BaseHandler, self).initialize(request, response)
+        # Objects loaded during this request, see get_catalog, get_index and get_package
+        self._identity_map = {}
+
+    def get_storage(self, cached=True):
+        """
+        Storage of the index, shared by all requests served by this instance (see _get_storages)
+        :param cached: if true, listings are served from the instance-wide cache. Use false where stale listings
+                       are not acceptable (e.g., checks preceding a write).
+        """
+        storage, caching_storage = _get_storages()
+        return caching_storage if cached else storage
+
+    def _identity(self, key, load, *args):
+        if key not in self._identity_map:
+            self._identity_map[key] = load(*args)
+        return self._identity_map[key]
+
+    def get_pending(self):
+        """
+        Records of the uploads not yet added to the catalog (see IndexMaintenance), listed at most once per request
+        :return: list of (stat, metadata) tuples
+        """
+        maintenance = IndexMaintenance(self.get_storage(cached=False))
+        return self._identity(('pending',), maintenance.pending_records)
+
+    def get_catalog(self, storage=None):
+        """
+        Catalog of the index, loaded at most once per request. Includes the uploads not yet added to the stored
+        catalog by the index maintenance (see get_pending).
+        :param storage: storage to load the catalog from, the cached storage if omitted
+        """
+        storage = storage if storage is not None else self.get_storage()
+
+        def load():
+            catalog = Catalog.load(storage)
+            IndexMaintenance.apply(catalog, self.get_pending())
+            return catalog
+        return self._identity(('catalog', id(storage)), load)
+
+    def get_index(self, name):
+        """
+        PackageIndex of a package (from the catalog of the cached storage), constructed at most once per request
+        """
+        storage = self.get_storage()
+        return self._identity(('index', name.lower()), PackageIndex.from_catalog, storage, name,
+                              self.get_catalog(storage))
+
+    def get_package(self, name, version):
+        """
+        Package of a version (from the catalog of the cached storage), constructed at most once per request.
+        The version is taken from the index of the package if that was already constructed.
+        :return: Package object, without files if the version does not exist
+        """
+        def load():
+            index = self._identity_map.get(('index', name.lower()))
+            if index is not None:
+                try:
+                    return index.get_version(version)
+                except GAEPyPIError:
+                    return Package(index.storage, name, version, [])
+            storage = self.get_storage()
+            return Package.from_catalog(storage, name, version, catalog=self.get_catalog(storage))
+        return self._identity(('package', name.lower(), version), load)
+
+    def not_modified(self, etag, last_modified=None, cache_control='private, no-cache'):
+        """
+        Set the cache validators on the response and evaluate the conditional request headers against them
+        :param etag: (unquoted) entity tag of the current representation
+        :param last_modified: modification time of the current representation as posix timestamp, if known
+        :return: True if the client's copy is up to date, in which case a 304 response has been prepared
+        """
+        self.response.headers['Cache-Control'] = cache_control
+        self.response.headers['ETag'] = quote_etag(etag)
+        if last_modified is not None:
+            self.response.headers['Last-Modified'] = http_date(last_modified)
+        if is_not_modified(self.request.headers.get('If-None-Match'), self.request.headers.get('If-Modified-Since'),
+                           etag, last_modified):
+            self.response.set_status(304)
+            return True
+        return False
+
+    def catalog_etag(self, catalog, *names):
+        """
+        Entity tag for a listing rendered from the catalog (or the part describing specific packages).
+        Rendered pages also depend on the deployed templates, hence the deployment is included.
+        """
+        return '{0}-{1}'.format(catalog.digest(*names), deployment_id())
+
+    def render(self, storage, catalog, *args):
+        """
+        Render the listing served by this handler in the negotiated media type (self.media_type), see serve_listing
+        :return: tuple (etag, body), None if the listing does not exist
+        """
+        raise NotImplementedError
+
+    def is_json(self):
+        return self.media_type.endswith('+json')
+
+    def static_page(self, *args):
+        """
+        Identifier of the pre-rendered page holding the HTML listing served by this handler, see StaticPages
+        :return: page identifier, None if the listing is always rendered
+        """
+        return None
+
+    def load_page(self, storage, *args):
+        """
+        Read the listing from the static pages if available, otherwise render it from the catalog
+        :return: tuple (etag, body), None if the listing does not exist
+        """
+        # Static pages are only updated once pending uploads are added to the catalog
+        page = None if self.is_json() or self.get_pending() else self.static_page(*args)
+        if page is None:
+            return self.render(storage, self.get_catalog(storage), *args)
+        # Missing until the first upload or rebuild with this version of the application
+        body = StaticPages(storage).read(page)
+        if body is None:
+            rendered = self.render(storage, self.get_catalog(storage), *args)
+            if rendered is None:
+                return None
+            body = rendered[1]
+        # Identical pages are served from both sources, so the validator is derived from the content
+        return hashlib.md5(body.encode('utf-8')).hexdigest(), body
+
+    def serve_listing(self, *args):
+        """
+        Serve the listing produced by render, in the media type preferred by the client and gzip compressed if
+        accepted. Rendered listings are kept in the shared page cache until the next change to the index, so the
+        catalog is only read and rendered once per generation.
+        """
+        if len(self.media_types) > 1:
+            media_type = self.request.accept.best_match(self.media_types)
+            if media_type is None:
+                self.response.set_status(406)
+                self.write_page('<h1>Not acceptable</h1>')
+                return
+            self.media_type = media_type.replace('.latest+', '.v1+')
+        compress = accepts_encoding(self.request.headers.get('Accept-Encoding'), 'gzip')
+
+        name = '{0}:{1}:{2}:{3}'.format(deployment_id(), self.media_type,
+                                        'gzip' if compress else 'identity', self.request.path)
+        generation = _page_cache.generation()
+        page = _page_cache.get(name, generation)
+        if page is None:
+            page = self.load_page(self.get_storage(), *args)
+            if page is None:
+                self.write404()
+                return
+            etag, body = page
+            if self.is_json():
+                etag += '-json'
+            else:
+                body = '<html><body>{}</body></html>'.format(body)
+            if compress:
+                etag, body = etag + '-gzip', gzip_compress(body.encode('utf-8'))
+            page = etag, body
+            _page_cache.set(name, generation, page)
+
+        etag, body = page
+        if len(self.media_types) > 1:
+            self.response.headers['Vary'] = 'Accept, Accept-Encoding'
+        else:
+            self.response.headers['Vary'] = 'Accept-Encoding'
+        if not self.not_modified(etag):
+            if self.is_json():
+                self.response.headers['Content-Type'] = self.media_type
+            else:
+                self.response.headers['Content-Type'] = '{0}; charset=utf-8'.format(self.media_type)
+            if compress:
+                self.response.headers['Content-Encoding'] = 'gzip'
+            self.response.write(body)
 
 
 # Handlers
@@ -57,27 +304,81 @@ class IndexHandler(BaseHandler):
         name = self.request.get('name', default_value=None)
         version = self.request.get('version', default_value=None)
         action = self.request.get(':action', default_value=None)
+        if action == 'batch_upload':
+            self.batch_upload(name, version)
+            return
         upload = self.request.POST.getall('content')[0]
-        content = upload.file.read()
         filename = upload.filename
 
-        if name and version and content and action == 'file_upload':
+        if name and version and _has_content(upload) and action == 'file_upload':
+            if not _is_segment(name, version, filename):
+                self.response.set_status(400)
+                self.write_page('<h1>Invalid package name, version or filename</h1>')
+                return
             try:
-                package = Package(self.get_storage(), name, version)
-                package.put_file(filename, content)
+                package = Package(self.get_storage(cached=False), name, version)
+                package.put_file(filename, upload.file)
             except GAEPyPIError as e:
                 self.response.set_status(403)
                 self.write_page('<h1>{0}</h1>'.format(str(e)))
 
+    def batch_upload(self, name, version):
+        """
+        Upload several files of a package version at once (one content part per file). Responds with the status
+        of every file as JSON: 200 if all files were added, 207 otherwise.
+        """
+        uploads = [upload for upload in self.request.POST.getall('content') if hasattr(upload, 'file')]
+        if not (name and version and uploads):
+            self.response.set_status(400)
+            self.write_page('<h1>Batch upload requires a name, version and content</h1>')
+            return
+        if not _is_segment(name, version):
+            self.response.set_status(400)
+            self.write_page('<h1>Invalid package name or version</h1>')
+            return
+
+        errors = []
+        for upload in uploads:
+            if not _is_segment(upload.filename):
+                errors.append('Invalid filename')
+            elif not _has_content(upload):
+                errors.append('Empty file')
+            else:
+                errors.append(None)
+        package = Package(self.get_storage(cached=False), name, version)
+        stored = iter(package.put_files([(upload.filename, upload.file) for upload, error in zip(uploads, errors)
+                                         if error is None]))
+        results = [next(stored) if error is None else (upload.filename, None, error)
+                   for upload, error in zip(uploads, errors)]
+        report = []
+        for filename, digests, error in results:
+            if error is None:
+                report.append({'filename': filename, 'status': 'ok', 'sha256': digests['sha256']})
+            else:
+                report.append({'filename': filename, 'status': 'error', 'error': error})
+        self.response.set_status(200 if all(error is None for _, _, error in results) else 207)
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps({'files': report}))
+
 
 class PypiHandler(BaseHandler):
     """
     Handles /pypi/
     """
 
+    media_types = SIMPLE_MEDIA_TYPES
+
     @basic_auth()
     def get(self):
-        self.write_page(self.get_storage().to_html(full_index=True))
+        self.serve_listing()
+
+    def static_page(self):
+        return 'pypi'
+
+    def render(self, storage, catalog):
+        if self.is_json():
+            return self.catalog_etag(catalog), catalog.to_json()
+        return self.catalog_etag(catalog), StaticPages(storage).render(catalog, 'pypi')
 
 
 class PypiPackageHandler(BaseHandler):
@@ -85,14 +386,60 @@ class PypiPackageHandler(BaseHandler):
     Handles /pypi/package
     """
 
+    media_types = SIMPLE_MEDIA_TYPES
+
     @basic_auth()
     def get(self, package):
-        storage = self.get_storage()
-        index = PackageIndex(storage, package)
-        if index.empty() or not index.exists(storage):
-            self.write404()
+        self.serve_listing(package)
+
+    def static_page(self, package):
+        return 'pypi/{0}'.format(package.lower())
+
+    def render(self, storage, catalog, package):
+        if self.is_json():
+            project = normalize_name(package)
+            names = catalog.projects().get(project)
+            return (self.catalog_etag(catalog, *names), catalog.to_json(project)) if names else None
+        body = StaticPages(storage).render(catalog, self.static_page(package))
+        return (self.catalog_etag(catalog, package), body) if body is not None else None
+
+
+class SimpleIndexHandler(BaseHandler):
+    """
+    Handles /simple/
+    """
+
+    media_types = SIMPLE_MEDIA_TYPES
+
+    @basic_auth()
+    def get(self):
+        self.serve_listing()
+
+    def render(self, storage, catalog):
+        return self.catalog_etag(catalog), catalog.to_json() if self.is_json() else catalog.to_html()
+
+
+class SimpleProjectHandler(BaseHandler):
+    """
+    Handles /simple/project/
+    """
+
+    media_types = SIMPLE_MEDIA_TYPES
+
+    @basic_auth()
+    def get(self, project):
+        normalized = normalize_name(project)
+        if project != normalized:
+            self.redirect('/simple/{0}/'.format(normalized), permanent=True)
             return
-        self.write_page(index.to_html(full_index=True))
+        self.serve_listing(project)
+
+    def render(self, storage, catalog, project):
+        names = catalog.projects().get(project)
+        if not names:
+            return None
+        body = catalog.to_json(project) if self.is_json() else catalog.to_html(project)
+        return self.catalog_etag(catalog, *names), body
 
 
 class PackageVersionHandler(BaseHandler):
@@ -104,11 +451,13 @@ class PackageVersionHandler(BaseHandler):
 
     @basic_auth()
     def get(self, package, version):
-        package = Package(self.get_storage(), package, version)
-        if not package.exists():
-            self.write404()
-            return
-        self.write_page(package.to_html())
+        self.serve_listing(package, version)
+
+    def render(self, storage, catalog, package, version):
+        package = self.get_package(package, version)
+        if package.empty():
+            return None
+        return self.catalog_etag(catalog, package.name), package.to_html()
 
 
 class PackageBase(BaseHandler):
@@ -118,12 +467,13 @@ class PackageBase(BaseHandler):
 
     @basic_auth()
     def get(self):
-        storage = self.get_storage()
-        if storage.empty():
-            body = 'Nothing to see here yet, try uploading a package!'
-        else:
-            body = storage.to_html(full_index=False)
-        self.write_page(body)
+        self.serve_listing()
+
+    def static_page(self):
+        return 'packages'
+
+    def render(self, storage, catalog):
+        return self.catalog_etag(catalog), StaticPages(storage).render(catalog, 'packages')
 
 
 class PackageList(BaseHandler):
@@ -133,11 +483,29 @@ class PackageList(BaseHandler):
 
     @basic_auth()
     def get(self, package):
-        index = PackageIndex(self.get_storage(), package)
-        if not index.exists():
+        self.serve_listing(package)
+
+    def static_page(self, package):
+        return 'packages/{0}'.format(package.lower())
+
+    def render(self, storage, catalog, package):
+        body = StaticPages(storage).render(catalog, self.static_page(package))
+        return (self.catalog_etag(catalog, package), body) if body is not None else None
+
+
+class PackageLatest(BaseHandler):
+    """
+    Handles /packages/package/latest
+    """
+
+    @basic_auth()
+    def get(self, package):
+        prereleases = self.request.get('prereleases', default_value='') in ('1', 'true')
+        latest = self.get_index(package).latest(prereleases=prereleases)
+        if latest is None:
             self.write404()
             return
-        self.write_page(index.to_html(full_index=False))
+        self.redirect('/packages/{0}/{1}'.format(latest.name, latest.version))
 
 
 class PackageDownload(BaseHandler):
@@ -147,14 +515,88 @@ class PackageDownload(BaseHandler):
 
     @basic_auth()
     def get(self, name, version, filename):
+        if not (_is_segment(name, version) and _is_segment(*filename.split('/'))):
+            self.write404()
+            return
+        # The file is looked up in storage directly: reading the catalog would cost more than the lookup itself,
+        # and files are served as soon as they are uploaded (before they are added to the catalog)
+        package = Package(self.get_storage(), name, version, [filename])
         try:
-            package = Package(self.get_storage(), name, version)
-            with package.get_file(filename) as gcs_file:
-                self.response.content_type = 'application/octet-stream'
-                self.response.headers.add('Content-Disposition', 'attachment; filename={0}'.format(filename))
-                self.response.write(gcs_file.read())
+            stat = package.stat_file(filename)
         except NotFoundError:
             self.write404()
+            return
+
+        # Large files are fetched from storage directly, rather than passing through this instance
+        threshold = os.environ.get('DOWNLOAD_REDIRECT_THRESHOLD')
+        if threshold and stat.st_size >= int(threshold):
+            expiration = int(os.environ.get('DOWNLOAD_URL_EXPIRATION', DEFAULT_URL_EXPIRATION))
+            url = package.file_url(filename, expiration)
+            if url is not None:
+                self.response.headers['Cache-Control'] = 'private, no-store'
+                self.redirect(url)
+                return
+
+        self.response.content_type = 'application/octet-stream'
+        self.response.headers.add('Content-Disposition', 'attachment; filename={0}'.format(filename))
+        self.response.headers['Accept-Ranges'] = 'bytes'
+        # Files can not be overwritten once uploaded, so clients may cache them
+        if self.not_modified(stat.etag, stat.st_ctime, cache_control='private, max-age=31536000'):
+            return
+
+        start, stop = 0, stat.st_size
+        if if_range_matches(self.request.headers.get('If-Range'), stat.etag, stat.st_ctime):
+            try:
+                start, stop = byte_range(self.request.headers.get('Range'), stat.st_size) or (start, stop)
+            except RangeNotSatisfiable:
+                self.response.set_status(416)
+                self.response.headers['Content-Range'] = 'bytes */{0}'.format(stat.st_size)
+                return
+            if (start, stop) != (0, stat.st_size):
+                self.response.set_status(206)
+                self.response.headers['Content-Range'] = 'bytes {0}-{1}/{2}'.format(start, stop - 1, stat.st_size)
+
+        buffer_size = int(os.environ.get('DOWNLOAD_BUFFER_SIZE', DEFAULT_BUFFER_SIZE))
+        # Files can not be replaced once uploaded, the etag of the stat above spares a second metadata query
+        self.response.app_iter = package.iter_file(filename, buffer_size, offset=start, length=stop - start,
+                                                   etag=stat.etag)
+        self.response.content_length = stop - start
+
+
+class RebuildCatalogHandler(BaseHandler):
+    """
+    Handles /admin/rebuild-catalog
+    """
+
+    @basic_auth(required_roles=['write'])
+    def post(self):
+        maintenance = IndexMaintenance(self.get_storage(cached=False))
+        maintenance.schedule_rebuild()
+        if maintenance.queue is None:
+            # Without a task queue, the rebuild ran synchronously
+            self.write_page('Catalog rebuilt')
+            return
+        self.response.set_status(202)
+        self.write_page('Catalog rebuild scheduled')
+
+
+class IndexTaskHandler(BaseHandler):
+    """
+    Handles /admin/tasks/index, the deferred index maintenance after uploads (see IndexMaintenance)
+    """
+
+    def post(self):
+        # Set by App Engine on requests of the task queue only
+        if 'X-AppEngine-QueueName' not in self.request.headers:
+            self.response.set_status(403)
+            return
+        params = dict(self.request.POST.items())
+        result = IndexMaintenance(self.get_storage(cached=False)).run(params)
+        if params.get('rebuild'):
+            catalog, pages = result
+            self.response.write('Catalog rebuilt, {0} packages indexed, {1} pages written'.format(len(catalog), pages))
+        else:
+            self.response.write('{0} uploads of {1} indexed'.format(result, params['package']))
 
 
 __all__ = [cls.__name__ for cls in BaseHandler.__subclasses__()]
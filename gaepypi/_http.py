@@ -0,0 +1,129 @@
+# GAEPyPi, private package index on Google App Engine
+# Copyright (C) 2017  ML2Grow BVBA
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import re
+import gzip
+from io import BytesIO
+from email.utils import formatdate, parsedate_tz, mktime_tz
+
+from .exceptions import RangeNotSatisfiable
+
+_byte_range = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def http_date(timestamp):
+    """
+    Format a posix timestamp as HTTP date
+    """
+    return formatdate(timestamp, usegmt=True)
+
+
+def parse_http_date(value):
+    """
+    :return: posix timestamp for given HTTP date, None if the value can not be parsed
+    """
+    parsed = parsedate_tz(value or '')
+    return mktime_tz(parsed) if parsed else None
+
+
+def quote_etag(etag):
+    return '"{0}"'.format(etag)
+
+
+def byte_range(header, length):
+    """
+    Interpret a Range header for a resource of given length. Only a single byte range is supported,
+    other (or malformed) range specifications are ignored.
+    :param header: value of the Range header
+    :param length: size of the resource in bytes
+    :return: (start, stop) tuple describing the byte range to serve (stop is exclusive), None for the full resource
+    :raises RangeNotSatisfiable: if the requested range lies outside the resource
+    """
+    match = _byte_range.match((header or '').replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        start, stop = max(length - int(last), 0), length
+    else:
+        start = int(first)
+        stop = min(int(last) + 1, length) if last else length
+    if start >= length or start >= stop:
+        raise RangeNotSatisfiable("Range {0} not satisfiable for length {1}".format(header, length))
+    return start, stop
+
+
+def if_range_matches(header, etag, last_modified):
+    """
+    Evaluate an If-Range header against the validators of the current representation
+    :param header: value of the If-Range header
+    :param etag: current (unquoted) entity tag
+    :param last_modified: current modification time as posix timestamp
+    :return: True if a Range request should be honoured
+    """
+    if not header:
+        return True
+    if header.startswith('"') or header.startswith('W/'):
+        return header == quote_etag(etag)
+    return parse_http_date(header) == int(last_modified)
+
+
+def is_not_modified(if_none_match, if_modified_since, etag, last_modified=None):
+    """
+    Evaluate the conditional request headers against the validators of the current representation
+    :param if_none_match: value of the If-None-Match header
+    :param if_modified_since: value of the If-Modified-Since header (ignored if If-None-Match is present)
+    :param etag: current (unquoted) entity tag
+    :param last_modified: current modification time as posix timestamp, if known
+    :return: True if the client's copy is up to date and a 304 Not Modified can be sent
+    """
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or quote_etag(etag) in [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+    if if_modified_since and last_modified is not None:
+        since = parse_http_date(if_modified_since)
+        return since is not None and int(last_modified) <= since
+    return False
+
+
+def accepts_encoding(header, coding):
+    """
+    Evaluate an Accept-Encoding header
+    :param header: value of the Accept-Encoding header
+    :param coding: content coding, e.g. gzip
+    :return: True if the client accepts the given content coding
+    """
+    for element in (header or '').split(','):
+        params = [param.strip() for param in element.split(';')]
+        if params[0].lower() in (coding, '*'):
+            qvalues = [param[2:] for param in params[1:] if param.replace(' ', '').startswith('q=')]
+            try:
+                return not qvalues or float(qvalues[0]) > 0
+            except ValueError:
+                return False
+    return False
+
+
+def gzip_compress(data, compresslevel=6):
+    """
+    Compress data in gzip format. The modification time in the header is zeroed so identical
+    input always results in identical output.
+    """
+    buf = BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=compresslevel, mtime=0) as gzip_file:
+        gzip_file.write(data)
+    return buf.getvalue()
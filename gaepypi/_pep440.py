@@ -0,0 +1,97 @@
+# GAEPyPi, private package index on Google App Engine
+# Copyright (C) 2017  ML2Grow BVBA
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import re
+
+from ._cache import LRUCache
+
+_version = re.compile(r"""
+    ^\s*v?
+    (?:(?P<epoch>[0-9]+)!)?
+    (?P<release>[0-9]+(?:\.[0-9]+)*)
+    (?:[-_.]?(?P<pre_l>a|b|c|rc|alpha|beta|pre|preview)[-_.]?(?P<pre_n>[0-9]+)?)?
+    (?:(?:-(?P<post_n1>[0-9]+))|(?:[-_.]?(?P<post_l>post|rev|r)[-_.]?(?P<post_n2>[0-9]+)?))?
+    (?:[-_.]?(?P<dev_l>dev)[-_.]?(?P<dev_n>[0-9]+)?)?
+    (?:\+(?P<local>[a-z0-9]+(?:[-_.][a-z0-9]+)*))?
+    \s*$
+""", re.VERBOSE | re.IGNORECASE)
+
+_pre_release_rank = {'a': 0, 'alpha': 0, 'b': 1, 'beta': 1, 'c': 2, 'rc': 2, 'pre': 2, 'preview': 2}
+
+_infinity = float('inf')
+
+# Shared by the keys of all final releases and of development releases without pre-release segment
+_final_release = (3, 0)
+_development_release = (-1, 0)
+
+# Version strings recur across packages, their keys are shared
+_keys = LRUCache(max_size=4096)
+
+
+def version_key(version):
+    """
+    Sort key for a version string following the ordering of PEP 440. Strings which are not valid PEP 440
+    versions sort before all valid versions, in lexicographical order among themselves.
+    :param version: version string
+    :return: tuple, comparable with the keys of other versions
+    """
+    key = _keys.get(version)
+    if key is None:
+        key = _parse(version)
+        _keys.set(version, key)
+    return key
+
+
+def _parse(version):
+    match = _version.match(version)
+    if not match:
+        return 0, version
+
+    release = [int(part) for part in match.group('release').split('.')]
+    while len(release) > 1 and release[-1] == 0:
+        release.pop()
+
+    if match.group('pre_l'):
+        pre = _pre_release_rank[match.group('pre_l').lower()], int(match.group('pre_n') or 0)
+    elif match.group('dev_l') and not (match.group('post_l') or match.group('post_n1')):
+        # 1.0.dev0 precedes 1.0a0
+        pre = _development_release
+    else:
+        pre = _final_release
+
+    if match.group('post_l') or match.group('post_n1'):
+        post = int(match.group('post_n1') or match.group('post_n2') or 0)
+    else:
+        post = -1
+
+    dev = int(match.group('dev_n') or 0) if match.group('dev_l') else _infinity
+
+    local = ()
+    if match.group('local'):
+        # Numeric segments sort after alphanumeric ones
+        local = tuple((1, int(part), '') if part.isdigit() else (0, 0, part.lower())
+                      for part in re.split(r'[-_.]', match.group('local')))
+
+    return 1, int(match.group('epoch') or 0), tuple(release), pre, post, dev, local
+
+
+def is_prerelease(key):
+    """
+    :param key: version key, see version_key
+    :return: True if the key belongs to a pre-release or development release
+    """
+    return key[0] == 1 and (key[3][0] < 3 or key[5] != _infinity)
@@ -0,0 +1,106 @@
+# GAEPyPi, private package index on Google App Engine
+# Copyright (C) 2017  ML2Grow BVBA
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import hmac
+import time
+import hashlib
+import binascii
+
+import six
+from six.moves.urllib.parse import quote
+
+from ._appengine import app_identity
+
+SIGNING_HOST = 'storage.googleapis.com'
+SIGNING_ALGORITHM = 'GOOG4-RSA-SHA256'
+# Longest expiration accepted by Cloud Storage for V4 signatures, in seconds
+MAX_EXPIRATION = 7 * 24 * 3600
+
+
+def _quote(value, safe='~'):
+    if isinstance(value, six.text_type):
+        value = value.encode('utf-8')
+    return quote(value, safe=safe)
+
+
+class AppIdentitySigner(object):
+    """
+    Signs with the key of the default service account of the application
+    """
+
+    @property
+    def service_account(self):
+        return app_identity.get_service_account_name()
+
+    def sign(self, blob):
+        return app_identity.sign_blob(blob)[1]
+
+
+class LocalSigner(object):
+    """
+    Stand-in for AppIdentitySigner in tests and local development: signs with an HMAC of a local secret.
+    URLs signed this way are not accepted by Cloud Storage, but can be checked with verify.
+    """
+
+    def __init__(self, secret=b'gaepypi', service_account='local@localhost'):
+        self.secret = secret
+        self.service_account = service_account
+
+    def sign(self, blob):
+        return hmac.new(self.secret, blob, hashlib.sha256).digest()
+
+    def verify(self, blob, signature):
+        return hmac.compare_digest(self.sign(blob), signature)
+
+
+def string_to_sign(path, query, timestamp):
+    """
+    Build the string signed for a V4 signed GET request of an object
+    :param path: path of the object (/bucket/object, not quoted)
+    :param query: list of (name, value) tuples of the query string, without the signature
+    :param timestamp: request time as returned by time.gmtime
+    :return: bytes
+    """
+    canonical_query = '&'.join('{0}={1}'.format(_quote(name), _quote(value)) for name, value in sorted(query))
+    canonical_request = '\n'.join(['GET', _quote(path, safe='/~'), canonical_query,
+                                   'host:{0}'.format(SIGNING_HOST), '', 'host', 'UNSIGNED-PAYLOAD'])
+    scope = '{0}/auto/storage/goog4_request'.format(time.strftime('%Y%m%d', timestamp))
+    return '\n'.join([SIGNING_ALGORITHM, time.strftime('%Y%m%dT%H%M%SZ', timestamp), scope,
+                      hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()]).encode('utf-8')
+
+
+def signed_url(path, expires_in, signer, now=None):
+    """
+    Produce a V4 signed URL granting temporary read access to an object in Cloud Storage
+    :param path: path of the object (/bucket/object)
+    :param expires_in: validity of the URL in seconds
+    :param signer: object with a service_account attribute and a sign method (see AppIdentitySigner)
+    :param now: posix time the validity starts, the current time if omitted
+    :return: URL string
+    """
+    timestamp = time.gmtime(time.time() if now is None else now)
+    credential = '{0}/{1}/auto/storage/goog4_request'.format(signer.service_account,
+                                                             time.strftime('%Y%m%d', timestamp))
+    query = [('X-Goog-Algorithm', SIGNING_ALGORITHM),
+             ('X-Goog-Credential', credential),
+             ('X-Goog-Date', time.strftime('%Y%m%dT%H%M%SZ', timestamp)),
+             ('X-Goog-Expires', str(max(1, min(int(expires_in), MAX_EXPIRATION)))),
+             ('X-Goog-SignedHeaders', 'host')]
+    signature = binascii.hexlify(signer.sign(string_to_sign(path, query, timestamp))).decode('ascii')
+    query_string = '&'.join('{0}={1}'.format(_quote(name), _quote(value)) for name, value in sorted(query))
+    return 'https://{0}{1}?{2}&X-Goog-Signature={3}'.format(SIGNING_HOST, _quote(path, safe='/~'),
+                                                           query_string, signature)
@@ -14,4 +14,14 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-__version__ = '0.0.1'
\ No newline at end of file
+import os
+
+__version__ = '0.0.1'
+
+
+def deployment_id():
+    """
+    Identifier of the deployed application, which changes with every deployment on App Engine (the version of
+    GAEPyPI elsewhere). Used to key everything rendered with the templates of the deployment.
+    """
+    return os.environ.get('CURRENT_VERSION_ID', __version__)
\ No newline at end of file
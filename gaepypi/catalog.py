@@ -0,0 +1,209 @@
+# GAEPyPi, private package index on Google App Engine
+# Copyright (C) 2017  ML2Grow BVBA
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import re
+import json
+import hashlib
+import datetime
+from contextlib import closing
+from .exceptions import NotFoundError
+
+from .templates import __templates__
+from .renderable import Renderable
+
+
+def normalize_name(name):
+    """
+    Normalize a project name as described in PEP 503
+    """
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+class Catalog(Renderable, dict):
+    """
+    Persisted manifest of the storage contents, mapping package names to {version: {filename: metadata}}.
+    The complete index is obtained with a single object read instead of walking the bucket.
+    """
+
+    filename = 'catalog.json'
+    api_version = '1.1'
+
+    def __init__(self, storage, packages=None):
+        super(Catalog, self).__init__(packages or {})
+        self.storage = storage
+        self._projects = None
+
+    @classmethod
+    def _read(cls, storage):
+        try:
+            with closing(storage.read(storage.get_index_path(cls.filename))) as catalog_file:
+                content = json.loads(catalog_file.read())
+        except NotFoundError:
+            return None
+        packages = content['packages']
+        for versions in packages.values():
+            for version, files in versions.items():
+                if isinstance(files, list):
+                    # Catalogs written before file metadata was recorded hold plain filename lists
+                    versions[version] = dict((filename, {}) for filename in files)
+        return cls(storage, packages)
+
+    @classmethod
+    def load(cls, storage, schedule_rebuild=True):
+        """
+        Read the catalog from storage. If no catalog was stored yet, it is obtained from a full scan and a rebuild
+        is scheduled to persist it (see IndexMaintenance, which serializes all writes of the catalog).
+        :param schedule_rebuild: if false, a missing catalog is only scanned (for use by the index maintenance)
+        :return: Catalog object
+        """
+        catalog = cls._read(storage)
+        if catalog is None:
+            catalog = cls.scan(storage)
+            if schedule_rebuild:
+                # Imported here, as the maintenance renders pages from PackageIndex objects
+                from .maintenance import IndexMaintenance
+                IndexMaintenance(storage).schedule_rebuild()
+        return catalog
+
+    @classmethod
+    def rebuild(cls, storage):
+        """
+        Regenerate the catalog from a full scan (see scan), and persist it. Only to be called from the index
+        maintenance, concurrent writes of the catalog would lose updates.
+        :return: Catalog object
+        """
+        catalog = cls.scan(storage)
+        catalog.save()
+        return catalog
+
+    @classmethod
+    def scan(cls, storage):
+        """
+        Produce the catalog by scanning all packages, versions and files in storage. Sizes and upload times are
+        taken from the listing, file metadata which can not be recovered from storage (hashes) is retained from
+        the stored catalog. The catalog is not persisted.
+        :return: Catalog object
+        """
+        previous = cls._read(storage) or cls(storage)
+        catalog = cls(storage)
+        for stat in storage.walk(storage.get_packages_path()):
+            components = storage.split_path(stat.filename)
+            if 'filename' in components:
+                name, version, filename = components['package'], components['version'], components['filename']
+                metadata = {'size': stat.st_size, 'upload_time': stat.st_ctime}
+                metadata.update(previous.files(name, version).get(filename, {}))
+                catalog.add_file(name, version, filename, **metadata)
+        return catalog
+
+    def versions(self, name):
+        """
+        :param name: package name
+        :return: dictionary mapping all versions of the package to their files
+        """
+        return self.get(name.lower(), {})
+
+    def files(self, name, version):
+        """
+        :return: dictionary mapping the filenames of the given package version to their metadata
+        """
+        return self.versions(name).get(version, {})
+
+    def projects(self):
+        """
+        :return: dictionary mapping normalized project names to the names of the packages in storage
+        """
+        if self._projects is None:
+            self._projects = {}
+            for name in sorted(self):
+                self._projects.setdefault(normalize_name(name), []).append(name)
+        return self._projects
+
+    def project_files(self, project):
+        """
+        :param project: normalized project name
+        :return: list of all files of the project (dictionaries with name, version, filename and metadata), sorted
+        """
+        files = []
+        for name in self.projects().get(project, []):
+            for version, version_files in self.versions(name).items():
+                for filename, metadata in version_files.items():
+                    files.append(dict(metadata, name=name, version=version, filename=filename))
+        return sorted(files, key=lambda f: f['filename'])
+
+    def digest(self, *names):
+        """
+        Fingerprint of the catalog contents, or of the versions of specific packages. Suitable as cache validator.
+        :param names: package names, if omitted the entire catalog is covered
+        :return: hex digest
+        """
+        content = [self.versions(name) for name in names] if names else self
+        return hashlib.md5(json.dumps(content, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def add_file(self, name, version, filename, **metadata):
+        """
+        Register a file in the catalog (the catalog is not persisted, see save)
+        :param metadata: file metadata to record: sha256, size and upload_time (posix timestamp)
+        """
+        files = self.setdefault(name.lower(), {}).setdefault(version, {})
+        files.setdefault(filename, {}).update(metadata)
+        self._projects = None
+
+    def empty(self):
+        return len(self) == 0
+
+    def to_html(self, project=None):
+        """
+        Render the simple repository API (PEP 503) pages
+        :param project: normalized project name. If omitted, the root page listing all projects is rendered.
+        """
+        if project is None:
+            template = __templates__.get_template('simple-index.html.j2')
+            return template.render({'projects': sorted(self.projects())})
+        template = __templates__.get_template('simple-project.html.j2')
+        return template.render({'project': project, 'files': self.project_files(project)})
+
+    def to_json(self, project=None):
+        """
+        Render the JSON variant of the simple repository API (PEP 691, with the sizes and upload times of PEP 700)
+        :param project: normalized project name. If omitted, the root page listing all projects is rendered.
+        """
+        meta = {'api-version': self.api_version}
+        if project is None:
+            return json.dumps({'meta': meta, 'projects': [{'name': name} for name in sorted(self.projects())]},
+                              sort_keys=True)
+
+        files, versions = [], set()
+        for file_info in self.project_files(project):
+            versions.add(file_info['version'])
+            entry = {'filename': file_info['filename'],
+                     'url': '/packages/{name}/{version}/{filename}'.format(**file_info),
+                     'hashes': {'sha256': file_info['sha256']} if 'sha256' in file_info else {}}
+            if 'size' in file_info:
+                entry['size'] = file_info['size']
+            if 'upload_time' in file_info:
+                upload_time = datetime.datetime.utcfromtimestamp(file_info['upload_time'])
+                entry['upload-time'] = upload_time.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+            files.append(entry)
+        return json.dumps({'meta': meta, 'name': project, 'versions': sorted(versions), 'files': files},
+                          sort_keys=True)
+
+    def save(self):
+        """
+        Write the catalog to storage
+        """
+        path = self.storage.get_index_path(self.filename)
+        self.storage.write(path, json.dumps({'packages': self}, sort_keys=True))
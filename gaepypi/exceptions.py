@@ -16,4 +16,15 @@
 
 
 class GAEPyPIError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+
+class RangeNotSatisfiable(GAEPyPIError):
+    pass
+
+
+class NotFoundError(GAEPyPIError):
+    """
+    Raised by all storages for files which do not exist
+    """
+    pass
@@ -0,0 +1,220 @@
+# GAEPyPi, private package index on Google App Engine
+# Copyright (C) 2017  ML2Grow BVBA
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+import time
+import hashlib
+import threading
+from contextlib import closing
+
+from .catalog import Catalog
+from .pagecache import PageCache
+from .staticpages import StaticPages
+from ._appengine import taskqueue, available
+
+# Serializes the maintenance run in-process, where no task queue is available
+_lock = threading.RLock()
+
+
+class TaskQueue(object):
+    """
+    Named tasks on an App Engine push queue. Adding a task which already exists (or recently existed) is a no-op.
+    """
+
+    def __init__(self, queue_name):
+        self.queue_name = queue_name
+
+    def add(self, name, url, params, countdown):
+        """
+        :return: True if the task was added, False if a task with the same name exists
+        """
+        try:
+            taskqueue.add(name=name, url=url, params=params, countdown=countdown, queue_name=self.queue_name)
+        except (taskqueue.TaskAlreadyExistsError, taskqueue.TombstonedTaskError):
+            return False
+        return True
+
+
+class LocalTaskQueue(object):
+    """
+    Minimal in-process stand-in for the task queue, for tests and local development. Tasks are kept until
+    taken from the queue with pop.
+    """
+
+    def __init__(self):
+        self.tasks = {}
+        self._names = set()
+        self._lock = threading.Lock()
+
+    def add(self, name, url, params, countdown):
+        with self._lock:
+            if name in self._names:
+                return False
+            self._names.add(name)
+            self.tasks[name] = {'url': url, 'params': params, 'countdown': countdown}
+            return True
+
+    def pop(self):
+        """
+        :return: list of all queued tasks (dictionaries with url, params and countdown), the queue is emptied
+        """
+        with self._lock:
+            tasks, self.tasks = list(self.tasks.values()), {}
+            return tasks
+
+
+class IndexMaintenance(object):
+    """
+    Deferred maintenance of the catalog and the static pages after uploads. An upload only records the new file
+    (in a small pending object in the bucket) and schedules a task for its package. All uploads of a package
+    within the same time window share this task, which applies all pending records with a single catalog update
+    and regenerates the static pages once. The tasks run in a queue without concurrency (see queue.yaml), so
+    updates of the catalog never race.
+    Where the task queue is not available (outside App Engine), or the storage is private to the instance (see
+    Storage.shared), the maintenance runs synchronously instead, serialized by a lock of the process.
+    """
+
+    queue_name = 'index-maintenance'
+    task_url = '/admin/tasks/index'
+    # Length of the time window in seconds, tasks run once their window has passed
+    coalesce_seconds = 5
+
+    def __init__(self, storage, queue=None, clock=time.time):
+        """
+        :param queue: queue to schedule tasks on, the App Engine task queue if omitted. Tasks are run
+                      synchronously if the queue is omitted and the task queue can not be used.
+        :param clock: function returning the current time in seconds
+        """
+        self.storage = storage
+        self._queue = queue
+        self._clock = clock
+
+    @property
+    def queue(self):
+        """
+        Queue tasks are scheduled on, None if they run synchronously. Resolved on first use, so reading pending
+        records does not import the task queue client.
+        """
+        if self._queue is None and self.storage.shared and available(taskqueue):
+            self._queue = TaskQueue(self.queue_name)
+        return self._queue
+
+    def get_pending_path(self, name=None):
+        path = self.storage.get_index_path('pending')
+        return '{0}/{1}'.format(path, name.lower()) if name else path
+
+    def record(self, name, version, filename, **metadata):
+        """
+        Register a file added to storage, and schedule the maintenance task of its package. Cached listings are
+        invalidated, so they are rendered again including the pending file.
+        :param metadata: file metadata, see Catalog.add_file
+        """
+        path = '{0}/{1}/{2}.json'.format(self.get_pending_path(name), version, filename)
+        self.storage.write(path, json.dumps(dict(metadata, name=name, version=version, filename=filename)))
+        PageCache().bump()
+        self.schedule(name)
+
+    def schedule(self, name):
+        """
+        Schedule the maintenance task of a package, unless it was scheduled within the current time window
+        :return: True if a task was added
+        """
+        return self._schedule('index-{0}'.format(hashlib.md5(name.lower().encode('utf-8')).hexdigest()),
+                              {'package': name.lower()})
+
+    def schedule_rebuild(self):
+        """
+        Schedule a rebuild of the catalog and all static pages (see rebuild), unless it was scheduled within the
+        current time window
+        :return: True if a task was added
+        """
+        return self._schedule('rebuild', {'rebuild': '1'})
+
+    def _schedule(self, prefix, params):
+        if self.queue is None:
+            with _lock:
+                self.run(params)
+            return True
+        window = int(self._clock() // self.coalesce_seconds)
+        return self.queue.add('{0}-{1}'.format(prefix, window), self.task_url, params, self.coalesce_seconds)
+
+    def run(self, params):
+        """
+        Run a maintenance task
+        :param params: parameters of the task, as scheduled by schedule or schedule_rebuild
+        :return: result of rebuild or process
+        """
+        if params.get('rebuild'):
+            return self.rebuild()
+        return self.process(params['package'])
+
+    def pending_records(self, name=None):
+        """
+        :return: list of (stat, metadata) tuples of the pending records (of a package, or of all packages)
+        """
+        records = []
+        for stat in self.storage.walk(self.get_pending_path(name)):
+            with closing(self.storage.read(stat.filename)) as record_file:
+                records.append((stat, json.loads(record_file.read())))
+        return records
+
+    @staticmethod
+    def apply(catalog, records):
+        """
+        Add the files of pending records to a catalog (without saving it)
+        :param records: list of (stat, metadata) tuples, see pending_records
+        """
+        for _, metadata in records:
+            metadata = dict(metadata)
+            catalog.add_file(metadata.pop('name'), metadata.pop('version'), metadata.pop('filename'), **metadata)
+
+    def process(self, name):
+        """
+        Apply all pending records of a package to the catalog and regenerate its static pages.
+        Records are only removed once the catalog was saved, so a failing task can safely be retried.
+        :return: number of records applied
+        """
+        records = self.pending_records(name)
+        if not records:
+            return 0
+
+        catalog = Catalog.load(self.storage, schedule_rebuild=False)
+        self.apply(catalog, records)
+        catalog.save()
+        StaticPages(self.storage).update(catalog, name)
+        PageCache().bump()
+
+        for stat, _ in records:
+            self.storage.delete(stat.filename)
+        return len(records)
+
+    def rebuild(self):
+        """
+        Regenerate the catalog from a full scan of the storage (see Catalog.scan) including all pending records,
+        and regenerate all static pages
+        :return: tuple of the catalog and the number of pages written
+        """
+        records = self.pending_records()
+        catalog = Catalog.scan(self.storage)
+        self.apply(catalog, records)
+        catalog.save()
+        pages = StaticPages(self.storage).rebuild(catalog)
+        PageCache().bump()
+
+        for stat, _ in records:
+            self.storage.delete(stat.filename)
+        return catalog, pages
@@ -15,16 +15,33 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from .exceptions import GAEPyPIError
+from .catalog import Catalog
 from .templates import __templates__
 from .renderable import Renderable
+from ._pep440 import version_key, is_prerelease
 
 import six
+import time
+import bisect
 from contextlib import contextmanager
 from abc import ABCMeta, abstractmethod
 
 
+def _intern(value):
+    """
+    Intern strings shared by many objects (package names and versions). Non-ASCII strings can not be interned
+    on Python 2, these are returned as is.
+    """
+    try:
+        return six.moves.intern(str(value))
+    except UnicodeEncodeError:
+        return value
+
+
 @six.add_metaclass(ABCMeta)
 class BucketObject(Renderable):
+    __slots__ = ()
+
     def __init__(self, storage, *args, **kwargs):
         super(BucketObject, self).__init__(*args, **kwargs)
         self.storage = storage
@@ -39,25 +56,59 @@ class BucketObject(Renderable):
 
 class Package(BucketObject):
     """
-    Class representing a Python package (name, version and files)
+    Class representing a Python package (name, version and files).
+    Instances are slotted and hold their filenames in a tuple, as full indices may contain many thousands of them.
     """
 
-    def __init__(self, storage, name, version):
+    __slots__ = ('storage', 'name', 'version', '_files', '_version_key')
+
+    @classmethod
+    def from_catalog(cls, storage, name, version, catalog=None):
+        """
+        Construct the package from the catalog, rather than listing its files in storage
+        :param catalog: Catalog object, loaded from storage if not provided
+        """
+        catalog = catalog if catalog is not None else Catalog.load(storage)
+        return cls(storage, name, version, catalog.files(name, version))
+
+    def __init__(self, storage, name, version, files=None):
+        """
+        :param files: filenames of this version. If omitted, files are listed from storage when first required.
+        """
         super(Package, self).__init__(storage)
-        self.name = name.lower()
-        self.version = version
+        self.name = _intern(name.lower())
+        self.version = _intern(version)
+        self._files = tuple(sorted(files)) if files is not None else None
+        self._version_key = None
 
-        files = []
-        path = storage.get_package_path(name.lower(), version)
-        for f in storage.ls(path+'/'):
-            files.append(storage.split_path(f)['filename'])
-        self.files = set(files)
+    @property
+    def files(self):
+        """
+        Filenames of this package version. Listed from storage on first access, cached afterwards.
+        :return: sorted tuple of filenames
+        """
+        if self._files is None:
+            path = self.storage.get_package_path(self.name, self.version)
+            self._files = tuple(sorted(self.storage.split_path(f)['filename'] for f in self.storage.ls(path+'/')))
+        return self._files
 
     def __str__(self):
         return '{0}-{1}'.format(self.name, self.version)
 
+    @property
+    def version_key(self):
+        """
+        PEP 440 sort key of the version, parsed on first access
+        """
+        if self._version_key is None:
+            self._version_key = version_key(self.version)
+        return self._version_key
+
+    def is_prerelease(self):
+        return is_prerelease(self.version_key)
+
     def __lt__(self, other):
-        return self.version < other.version if self.name == other.name else self.name < other.name
+        return self.version_key < other.version_key if self.name == other.name else self.name < other.name
 
     def __eq__(self, other):
         return isinstance(other, Package) \
@@ -68,7 +119,13 @@ class Package(BucketObject):
         return hash((self.name, self.version))
 
     def exists(self, storage=None):
-        storage = self.enquire_storage(storage)
+        """
+        Verify if this version is present in storage. Storage objects have no directories, so this is derived from
+        the files of the version (listed at most once), only other storages are queried.
+        :param storage: storage to query, if different from the one of this package
+        """
+        if storage is None or storage is self.storage:
+            return not self.empty()
         version_path = storage.get_package_path(self.name, self.version)
         return storage.path_exists(version_path)
 
@@ -79,47 +136,148 @@ class Package(BucketObject):
     def empty(self):
         return len(self.files) == 0
 
-    @contextmanager
-    def get_file(self, filename, storage=None):
+    def _file_path(self, filename, storage):
         if filename not in self.files:
             raise GAEPyPIError("File not found for {0}".format(self))
+        return storage.get_package_path(self.name, self.version, filename)
+
+    @contextmanager
+    def get_file(self, filename, storage=None):
         storage = self.enquire_storage(storage)
-        path = storage.get_package_path(self.name, self.version, filename)
-        gcs_file = storage.read(path)
+        gcs_file = storage.read(self._file_path(filename, storage))
         yield gcs_file
         gcs_file.close()
 
+    def iter_file(self, filename, buffer_size, offset=0, length=None, storage=None, etag=None):
+        """
+        Read (a byte range of) a file of this package in chunks
+        :param buffer_size: maximum size of a chunk (in bytes)
+        :param offset: number of bytes to skip at the start of the file
+        :param length: maximum number of bytes to read, the remainder of the file if None
+        :param etag: etag of the file if already known (see stat_file)
+        :return: iterator over the file content
+        """
+        storage = self.enquire_storage(storage)
+        return storage.iter_read(self._file_path(filename, storage), buffer_size=buffer_size,
+                                 offset=offset, length=length, etag=etag)
+
+    def file_url(self, filename, expires_in, storage=None):
+        """
+        Produce a URL granting temporary direct read access to a file of this package, see Storage.signed_url
+        :param expires_in: validity of the URL in seconds
+        :return: URL string, None if the storage does not support direct access
+        """
+        storage = self.enquire_storage(storage)
+        return storage.signed_url(self._file_path(filename, storage), expires_in)
+
+    def stat_file(self, filename, storage=None):
+        """
+        Query metadata of a file of this package
+        :return: object with attributes st_size (in bytes), etag and st_ctime (posix time)
+        """
+        storage = self.enquire_storage(storage)
+        return storage.stat(self._file_path(filename, storage))
+
     def put_file(self, filename, content, storage=None):
+        """
+        Add a file to this package version. The file is added to the catalog shortly after, see IndexMaintenance.
+        :param content: string, file-like object or iterable of strings
+        :return: dictionary with the hex digests (md5 and sha256) and the size of the file
+        """
         if filename in self.files:
             err_msg = "File {0} has already been added to {1}, upload a new version".format(filename, self)
             raise GAEPyPIError(err_msg)
         storage = self.enquire_storage(storage)
+        digests = self._store(filename, content, storage)
+        self._files = tuple(sorted(self.files + (filename,)))
+        return digests
+
+    def put_files(self, files, storage=None):
+        """
+        Add several files to this package version. All filenames are validated against a single listing, the
+        files are written concurrently (see Storage.map). A failing file does not prevent the others from being added.
+        :param files: list of (filename, content) tuples, content as accepted by put_file
+        :return: list of (filename, digests, error) tuples in the order of the files, with either the digests
+                 (see put_file) or the error message set
+        """
+        storage = self.enquire_storage(storage)
+        results, accepted, seen = [None] * len(files), [], set()
+        for i, (filename, _) in enumerate(files):
+            if filename in self.files:
+                error = "File {0} has already been added to {1}, upload a new version".format(filename, self)
+                results[i] = (filename, None, error)
+            elif filename in seen:
+                results[i] = (filename, None, "File {0} was given more than once".format(filename))
+            else:
+                seen.add(filename)
+                accepted.append(i)
+
+        def store(item):
+            filename, content = item
+            try:
+                return self._store(filename, content, storage), None
+            except Exception as e:
+                return None, str(e) or e.__class__.__name__
+
+        # Writes are never repeated implicitly, a failing file is reported instead
+        for i, (digests, error) in zip(accepted, storage.map(store, [files[i] for i in accepted], retries=0)):
+            results[i] = (files[i][0], digests, error)
+        self._files = tuple(sorted(self.files + tuple(filename for filename, digests, _ in results if digests)))
+        return results
+
+    def _store(self, filename, content, storage):
         path = storage.get_package_path(self.name, self.version, filename)
-        storage.write(path, content)
-        self.files.add(filename)
+        digests = storage.write(path, content)
+        # The catalog and pages are updated by a deferred task. Imported here, as the pages are rendered from
+        # PackageIndex objects.
+        from .maintenance import IndexMaintenance
+        IndexMaintenance(storage).record(self.name, self.version, filename, sha256=digests['sha256'],
+                                         size=digests['size'], upload_time=time.time())
+        return digests
 
 
-class PackageIndex(BucketObject, set):
+class PackageIndex(BucketObject):
     """
-    Class representing a package index (for a name, all versions present in storage)
+    Class representing a package index (for a name, all versions present in storage).
+    The packages are kept in a list in PEP 440 order, versions are looked up by bisection.
     """
 
+    __slots__ = ('storage', 'name', '_packages', '_keys')
+
     @classmethod
-    def get_all(cls, storage):
+    def get_all(cls, storage, catalog=None):
         """
-        Get all Package indices for a given storage
+        Get all Package indices for a given storage, as registered in the catalog
+        :param catalog: Catalog object, loaded from storage if not provided
         :return: iterable of PackageIndex
         """
-        path = storage.get_packages_path()
-        packages = storage.ls(path, dir_only=True)
-        return [cls(storage, storage.split_path(package_path)['package']) for package_path in packages]
+        catalog = catalog if catalog is not None else Catalog.load(storage)
+        return [cls(storage, name, versions) for name, versions in six.iteritems(catalog)]
 
-    def __init__(self, storage, name):
-        package_path = storage.get_package_path(name.lower())
-        contents = storage.ls(package_path, dir_only=True)
-        versions = [storage.split_path(version_path)['version'] for version_path in contents]
-        super(PackageIndex, self).__init__(storage, [Package(storage, name, v) for v in versions])
-        self.name = name
+    @classmethod
+    def from_catalog(cls, storage, name, catalog=None):
+        """
+        Construct the index from the catalog, rather than listing all versions in storage
+        :param catalog: Catalog object, loaded from storage if not provided
+        """
+        catalog = catalog if catalog is not None else Catalog.load(storage)
+        return cls(storage, name, catalog.versions(name))
+
+    def __init__(self, storage, name, versions=None):
+        """
+        :param versions: dictionary mapping versions to filenames. If omitted, versions and files are listed.
+        """
+        if versions is None:
+            package_path = storage.get_package_path(name.lower())
+            contents = storage.ls(package_path, dir_only=True)
+            versions = [storage.split_path(version_path)['version'] for version_path in contents]
+            packages = [Package(storage, name, v) for v in versions]
+        else:
+            packages = [Package(storage, name, v, files) for v, files in six.iteritems(versions)]
+        super(PackageIndex, self).__init__(storage)
+        self.name = _intern(name)
+        self._packages = sorted(packages, key=lambda p: p.version_key)
+        self._keys = [p.version_key for p in self._packages]
 
     def __str__(self):
         return "Package Index for {0}".format(self.name)
@@ -127,6 +285,16 @@ class PackageIndex(BucketObject, set):
     def __lt__(self, other):
         return self.name < other.name
 
+    def __iter__(self):
+        return iter(self._packages)
+
+    def __len__(self):
+        return len(self._packages)
+
+    def __contains__(self, package):
+        return isinstance(package, Package) and package.name == self.name.lower() \
+            and self._find(package.version) is not None
+
     @property
     def size(self):
         return len(self)
@@ -135,7 +303,13 @@ class PackageIndex(BucketObject, set):
         return self.size == 0
 
     def exists(self, storage=None):
-        storage = self.enquire_storage(storage)
+        """
+        Verify if this package is present in storage. This is derived from the versions listed (or read from the
+        catalog) on construction, only other storages are queried.
+        :param storage: storage to query, if different from the one of this index
+        """
+        if storage is None or storage is self.storage:
+            return not self.empty()
         package_path = storage.get_package_path(self.name)
         return storage.path_exists(package_path)
 
@@ -151,7 +325,9 @@ class PackageIndex(BucketObject, set):
         if other in self:
             raise GAEPyPIError("Version already exists, you should upload a different version.")
 
-        super(PackageIndex, self).add(other)
+        position = bisect.bisect_right(self._keys, other.version_key)
+        self._keys.insert(position, other.version_key)
+        self._packages.insert(position, other)
 
     def to_html(self, full_index=True):
         if full_index:
@@ -159,14 +335,42 @@ class PackageIndex(BucketObject, set):
             return template.render({'indices': [self]})
         else:
             template = __templates__.get_template('version-index.html.j2')
-            return template.render({'packages': self})
+            return template.render({'packages': self.ordered()})
+
+    def ordered(self):
+        """
+        :return: list of the packages in this index, sorted by version (PEP 440)
+        """
+        return list(self._packages)
+
+    def _find(self, version):
+        key = version_key(version)
+        position = bisect.bisect_left(self._keys, key)
+        # Distinct version strings may be equivalent (1.0 and 1.0.0)
+        while position < len(self._keys) and self._keys[position] == key:
+            if self._packages[position].version == version:
+                return self._packages[position]
+            position += 1
+        return None
 
     def get_version(self, version):
         """
         Get package of specific version from the index
         :return: Package object of given version
         """
-        for p in self:
-            if p.version == version:
-                return p
-        raise GAEPyPIError("Version {0} not found!".format(version))
+        package = self._find(version)
+        if package is None:
+            raise GAEPyPIError("Version {0} not found!".format(version))
+        return package
+
+    def latest(self, prereleases=False):
+        """
+        Get the package with the highest version in the index
+        :param prereleases: if False, pre-releases are only considered if the index holds no final releases
+        :return: Package object, None if the index is empty
+        """
+        if not prereleases:
+            for package in reversed(self._packages):
+                if not package.is_prerelease():
+                    return package
+        return self._packages[-1] if self._packages else None
@@ -0,0 +1,119 @@
+# GAEPyPi, private package index on Google App Engine
+# Copyright (C) 2017  ML2Grow BVBA
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import time
+import logging
+import threading
+
+from ._appengine import memcache, available
+
+
+class LocalCacheClient(object):
+    """
+    Minimal in-process stand-in for the memcache client, for tests and local development
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._values.get(key)
+
+    def set(self, key, value):
+        self._values[key] = value
+        return True
+
+    def incr(self, key, delta=1, initial_value=None):
+        with self._lock:
+            if key not in self._values:
+                if initial_value is None:
+                    return None
+                self._values[key] = initial_value
+            self._values[key] += delta
+            return self._values[key]
+
+
+# Used by all page caches of the process where memcache is not available
+_local_client = LocalCacheClient()
+
+
+class PageCache(object):
+    """
+    Cache for rendered pages, shared by all instances through memcache. Keys are generational: every change to
+    the index bumps the generation, which implicitly invalidates all pages rendered before.
+    Outside App Engine, pages are cached in the memory of the process instead.
+    """
+
+    generation_key = 'gaepypi:generation'
+
+    def __init__(self, client=None):
+        """
+        :param client: memcache compatible client. If omitted, the App Engine memcache service, or an in-process
+                       cache if memcache can not be imported (resolved on first use).
+        """
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = memcache if available(memcache) else _local_client
+        return self._client
+
+    def _key(self, name, generation):
+        return 'gaepypi:page:{0}:{1}'.format(generation, name)
+
+    def generation(self):
+        """
+        :return: current generation of the index, None if the cache is unavailable
+        """
+        generation = self.client.get(self.generation_key)
+        if generation is None:
+            # Start from the current time, so pages cached under the generations preceding an eviction of the
+            # counter are never served again
+            generation = self.client.incr(self.generation_key, initial_value=int(time.time()))
+        return generation
+
+    def bump(self):
+        """
+        Start a new generation, to be called on every change to the index
+        """
+        self.client.incr(self.generation_key, initial_value=int(time.time()))
+
+    def get(self, name, generation):
+        """
+        :param name: page identifier
+        :param generation: generation obtained before the page was looked up
+        :return: cached page, None if absent
+        """
+        if generation is None:
+            return None
+        return self.client.get(self._key(name, generation))
+
+    def set(self, name, generation, page):
+        """
+        Cache a page. The generation must have been obtained before reading the data the page was rendered from.
+        Pages exceeding the size limit of memcache are not cached.
+        :return: True if the page was cached
+        """
+        if generation is None:
+            return False
+        try:
+            return bool(self.client.set(self._key(name, generation), page))
+        except ValueError as e:
+            logging.warning('Page %s not cached: %s', name, e)
+            return False
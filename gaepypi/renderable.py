@@ -21,6 +21,8 @@ import six
 
 @six.add_metaclass(ABCMeta)
 class Renderable(object):
+    __slots__ = ()
+
     @abstractmethod
     def to_html(self):
         pass
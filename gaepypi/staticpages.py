@@ -0,0 +1,101 @@
+# GAEPyPi, private package index on Google App Engine
+# Copyright (C) 2017  ML2Grow BVBA
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from contextlib import closing
+
+from .package import PackageIndex
+from .exceptions import NotFoundError
+from .templates import templates_checksum
+
+
+class StaticPages(object):
+    """
+    Listings pre-rendered from the catalog and stored as objects in the bucket, so serving them takes a single
+    object read regardless of the size of the index. The root pages and the pages of a package are regenerated
+    whenever a file is added to it. Pages are keyed on the templates (see templates_checksum), so deployments
+    rendering identical pages share them, while deployments with other templates serving traffic at the same time
+    never overwrite each other's pages.
+
+    Pages are identified as pypi, packages (the root pages), pypi/<name> and packages/<name>.
+    """
+
+    root_pages = ['pypi', 'packages']
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    @staticmethod
+    def package_pages(name):
+        return ['pypi/{0}'.format(name.lower()), 'packages/{0}'.format(name.lower())]
+
+    def get_pages_path(self):
+        return self.storage.get_index_path('pages/{0}'.format(templates_checksum()))
+
+    def path(self, page):
+        return '{0}/{1}.html'.format(self.get_pages_path(), page)
+
+    def render(self, catalog, page):
+        """
+        Render a page from the catalog
+        :return: page body, None if the package of the page does not exist
+        """
+        section, _, name = page.partition('/')
+        if not name:
+            if section == 'packages' and self.storage.empty(catalog=catalog):
+                return 'Nothing to see here yet, try uploading a package!'
+            return self.storage.to_html(full_index=section == 'pypi', catalog=catalog)
+        index = PackageIndex.from_catalog(self.storage, name, catalog=catalog)
+        if index.empty():
+            return None
+        return index.to_html(full_index=section == 'pypi')
+
+    def read(self, page):
+        """
+        :return: stored page body, None if the page was not generated
+        """
+        try:
+            with closing(self.storage.read(self.path(page))) as page_file:
+                return page_file.read().decode('utf-8')
+        except NotFoundError:
+            return None
+
+    def update(self, catalog, *names):
+        """
+        Regenerate and store the root pages and the pages of the given packages
+        :return: number of pages written
+        """
+        pages = self.root_pages + [page for name in names for page in self.package_pages(name)]
+        written = 0
+        for page in pages:
+            body = self.render(catalog, page)
+            if body is not None:
+                self.storage.write(self.path(page), body)
+                written += 1
+        return written
+
+    def rebuild(self, catalog):
+        """
+        Regenerate all pages, and remove the pages of packages which are no longer in the catalog. The pages of
+        other templates are left alone, as they may still be served by another version of the application.
+        :return: number of pages written
+        """
+        keep = set(self.path(page) for page in self.root_pages)
+        keep.update(self.path(page) for name in catalog for page in self.package_pages(name))
+        for stat in self.storage.walk(self.get_pages_path()):
+            if stat.filename not in keep:
+                self.storage.delete(stat.filename)
+        return self.update(catalog, *catalog)
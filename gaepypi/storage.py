@@ -17,16 +17,166 @@
 from .package import PackageIndex
 from .templates import __templates__
 from .renderable import Renderable
+from .exceptions import NotFoundError
+from ._cache import LRUCache
+from ._concurrent import bounded_map
+from ._signing import AppIdentitySigner, signed_url
+from ._appengine import cloudstorage as gcs
 
+import os
 import six
+import mmap
+import errno
+import hashlib
+import tempfile
+import itertools
 from abc import ABCMeta, abstractmethod
-import cloudstorage as gcs
 
-my_default_retry_params = gcs.RetryParams(initial_delay=0.2,
-                                          max_delay=5.0,
-                                          backoff_factor=2,
-                                          max_retry_period=15)
-gcs.set_default_retry_params(my_default_retry_params)
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+DEFAULT_LISTING_CONCURRENCY = 8
+
+
+def _iter_chunks(file_obj, chunk_size, length=None):
+    remaining = length
+    try:
+        while remaining is None or remaining > 0:
+            chunk = file_obj.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+    finally:
+        file_obj.close()
+
+
+def _write_chunks(file_obj, content, chunk_size):
+    if isinstance(content, (six.binary_type, six.text_type)):
+        chunks = [content]
+    elif hasattr(content, 'read'):
+        chunks = iter(lambda: content.read(chunk_size), b'')
+    else:
+        chunks = content
+
+    digests = {'md5': hashlib.md5(), 'sha256': hashlib.sha256()}
+    size = 0
+    for chunk in chunks:
+        if isinstance(chunk, six.text_type):
+            chunk = chunk.encode('utf-8')
+        for digest in digests.values():
+            digest.update(chunk)
+        file_obj.write(chunk)
+        size += len(chunk)
+    result = dict((name, digest.hexdigest()) for name, digest in six.iteritems(digests))
+    result['size'] = size
+    return result
+
+
+# Atomic (on POSIX) replacement of an existing file, os.replace is not available on Python 2
+_replace = getattr(os, 'replace', os.rename)
+
+
+class _DirEntry(object):
+    """
+    Minimal stand-in for os.DirEntry, on Python versions without os.scandir
+    """
+
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = '{0}/{1}'.format(directory, name)
+
+    def is_dir(self):
+        return os.path.isdir(self.path)
+
+    def stat(self):
+        return os.stat(self.path)
+
+
+def _scandir(path):
+    """
+    :return: list of the entries of a directory (see os.scandir), empty if the directory does not exist
+    """
+    try:
+        if hasattr(os, 'scandir'):
+            return list(os.scandir(path))
+        return [_DirEntry(path, name) for name in os.listdir(path)]
+    except OSError as e:
+        if e.errno in (errno.ENOENT, errno.ENOTDIR):
+            return []
+        raise
+
+
+def _not_found(func):
+    """
+    Raise NotFoundError for missing files (rather than the error of the file system), so callers handle all
+    storages alike
+    """
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except (IOError, OSError) as e:
+            if e.errno in (errno.ENOENT, errno.EISDIR, errno.ENOTDIR):
+                raise NotFoundError(str(e))
+            raise
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def _gcs_not_found(func):
+    """
+    Raise NotFoundError for missing objects (rather than the error of cloudstorage), see _not_found
+    """
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except gcs.NotFoundError as e:
+            raise NotFoundError(str(e))
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+class _MappedFile(object):
+    """
+    Read-only file object backed by a memory map of the file, so reads are served from the page cache
+    without system calls
+    """
+
+    def __init__(self, path, offset=0):
+        with open(path, 'rb') as file_obj:
+            self._size = os.fstat(file_obj.fileno()).st_size
+            # Empty files can not be mapped
+            self._map = mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ) if self._size else None
+        self._position = min(offset, self._size)
+
+    def read(self, size=-1):
+        end = self._size if size is None or size < 0 else min(self._size, self._position + size)
+        if self._map is None or end <= self._position:
+            return b''
+        chunk = self._map[self._position:end]
+        self._position = end
+        return chunk
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+class LocalFileStat(object):
+    """
+    File metadata, with the attributes of the stats of cloudstorage
+    """
+    __slots__ = ('filename', 'st_size', 'st_ctime', 'etag', 'is_dir')
+
+    def __init__(self, filename, stat):
+        self.filename = filename
+        self.st_size = stat.st_size
+        # Files are never modified in place, the last modification is their creation
+        self.st_ctime = stat.st_mtime
+        self.etag = '{0:x}-{1:x}'.format(int(stat.st_mtime * 1000000), stat.st_size)
+        self.is_dir = False
 
 
 @six.add_metaclass(ABCMeta)
@@ -34,6 +184,8 @@ class Storage(Renderable):
     """
     Storage abstract class, describing the interface assumed by the Package/PackageIndex classes
     """
+    # True if all instances of the application see the same storage (e.g., tasks can run on another instance)
+    shared = True
 
     @abstractmethod
     def get_packages_path(self):
@@ -52,6 +204,14 @@ class Storage(Renderable):
         """
         pass
 
+    @abstractmethod
+    def get_index_path(self, filename=None):
+        """
+        Produce the path where index data (such as the catalog) is kept
+        :param filename: specific file
+        """
+        pass
+
     @abstractmethod
     def split_path(self, path):
         """
@@ -72,18 +232,42 @@ class Storage(Renderable):
         pass
 
     @abstractmethod
-    def read(self, path):
+    def read(self, path, buffer_size=DEFAULT_BUFFER_SIZE, offset=0):
         """
         Read a specific file
         :param path: path to file
-        :return: file object
+        :param buffer_size: size of the read buffer (in bytes)
+        :param offset: number of bytes to skip at the start of the file
+        :return: file object, NotFoundError is raised if the file does not exist
+        """
+        pass
+
+    @abstractmethod
+    def stat(self, path):
+        """
+        Query file metadata
+        :param path: path to file
+        :return: object with attributes st_size (in bytes), etag and st_ctime (posix time). NotFoundError is
+                 raised if the file does not exist.
         """
         pass
 
     @abstractmethod
     def write(self, path, content):
         """
-        Write content to file
+        Write content to file. Content provided as file-like object or iterable is written in chunks,
+        so it is never held in memory as a whole.
+        :param path: path to file
+        :param content: string, file-like object or iterable of strings
+        :return: dictionary with the hex digests (md5 and sha256) and the size of the written content
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, path):
+        """
+        Remove a file
+        :param path: path to file
         """
         pass
 
@@ -94,18 +278,82 @@ class Storage(Renderable):
         """
         pass
 
-    def empty(self):
+    @abstractmethod
+    def path_exists(self, path):
+        """
+        Query if a file or directory exists
+        """
+        pass
+
+    def iter_read(self, path, buffer_size=DEFAULT_BUFFER_SIZE, offset=0, length=None, etag=None):
+        """
+        Read a specific file in chunks, so it is never held in memory as a whole
+        :param path: path to file
+        :param buffer_size: maximum size of a chunk (in bytes)
+        :param offset: number of bytes to skip at the start of the file
+        :param length: maximum number of bytes to read, the remainder of the file if None
+        :param etag: etag of the file as returned by stat, if already known (spares caching storages a query)
+        :return: iterator over the file content
+        """
+        return _iter_chunks(self.read(path, buffer_size=buffer_size, offset=offset), buffer_size, length)
+
+    def map(self, func, items, retries=None):
+        """
+        Apply a function performing storage requests to all items. Storage implementations may issue the
+        requests concurrently, this implementation calls the function sequentially.
+        :param retries: number of times a call failing on a transient error is repeated, None for the default of
+                        the storage (meant for listings). Pass 0 for requests which must not be repeated, like writes.
+        :return: list of results, in the order of the items
+        """
+        return [func(item) for item in items]
+
+    def ls_many(self, paths, dir_only=False):
+        """
+        List the nodes below several paths, see ls and map
+        :return: list of listings, in the order of the paths
+        """
+        return self.map(lambda path: self.ls(path, dir_only=dir_only), paths)
+
+    def walk(self, path):
+        """
+        List all files below a given path, recursively, in lexicographical order. This implementation descends
+        level by level (listing all directories of a level with ls_many) and queries the metadata of every file,
+        storage implementations should provide a more efficient alternative.
+        :param path: scan this path
+        :return: iterable of file metadata, objects with attributes filename, st_size, etag and st_ctime
+        """
+        directories, files = [path], []
+        while directories:
+            nodes = list(itertools.chain.from_iterable(self.ls_many(directories)))
+            directories = [node for node in nodes if node.endswith('/')]
+            files.extend(node for node in nodes if not node.endswith('/'))
+        return self.map(self.stat, sorted(files))
+
+    def signed_url(self, path, expires_in):
+        """
+        Produce a URL granting temporary read access to a file directly, without passing through the application
+        :param path: path to file
+        :param expires_in: validity of the URL in seconds
+        :return: URL string, None if the storage does not support direct access
+        """
+        return None
+
+    def empty(self, catalog=None):
         """
         Verify if any packages are present in the storage
+        :param catalog: Catalog object describing the storage. If omitted, the storage is probed directly.
         """
-        return len(PackageIndex.get_all(self)) == 0
+        if catalog is not None:
+            return len(catalog) == 0
+        return not self.path_exists(self.get_packages_path())
 
-    def to_html(self, full_index=True):
+    def to_html(self, full_index=True, catalog=None):
         """
-        Render overview of all packages in storage
+        Render overview of all packages in storage (according to the catalog)
         :param full_index: if true, print all files for all versions. if false, only print package names (once)
+        :param catalog: Catalog object, loaded from storage if not provided
         """
-        package_indices = PackageIndex.get_all(self)
+        package_indices = PackageIndex.get_all(self, catalog=catalog)
         template_file = 'storage-index.html.j2' if not full_index else 'package-index.html.j2'
         template = __templates__.get_template(template_file)
         return template.render({'indices': package_indices})
@@ -115,9 +363,22 @@ class GCStorage(Storage):
     """
     Implementation of the Storage abstract class for Google Cloud Storage
     """
-    def __init__(self, bucket, acl='project-private'):
+    # Number of times a request failing with a transient error is repeated
+    listing_retries = 2
+
+    def __init__(self, bucket, acl='project-private', bulk_listing=True, max_concurrency=1, signer=None):
+        """
+        :param bulk_listing: if true, walk performs a single flat (paginated) listing of all objects below a path.
+                             Otherwise, the top level directories are listed in parallel (if max_concurrency
+                             permits) or the hierarchy is listed level by level.
+        :param max_concurrency: maximum number of requests (listings, batch uploads) issued in parallel (see map)
+        :param signer: signer of the URLs produced by signed_url, the service account of the application if omitted
+        """
         self.bucket = bucket
         self.acl = acl
+        self.bulk_listing = bulk_listing
+        self.max_concurrency = max_concurrency
+        self.signer = signer
 
     def get_packages_path(self):
         return '/{0}/packages'.format(self.bucket)
@@ -130,6 +391,12 @@ class GCStorage(Storage):
                 path = '{0}/{1}'.format(path, filename)
         return path
 
+    def get_index_path(self, filename=None):
+        path = '/{0}/index'.format(self.bucket)
+        if filename:
+            path = '{0}/{1}'.format(path, filename)
+        return path
+
     def split_path(self, path):
         segments = path.split('/')
         assert segments[1] == self.bucket
@@ -141,14 +408,52 @@ class GCStorage(Storage):
         padded = path if path[-1] == '/' else path+'/'
         return [f.filename for f in gcs.listbucket(padded, delimiter='/') if f.is_dir or not dir_only]
 
-    def read(self, path):
-        return gcs.open(path)
+    def empty(self, catalog=None):
+        if catalog is not None:
+            return super(GCStorage, self).empty(catalog=catalog)
+        # A single object suffices to decide
+        return len(list(gcs.listbucket(self.get_packages_path() + '/', max_keys=1))) == 0
+
+    def map(self, func, items, retries=None):
+        return bounded_map(func, items, self.max_concurrency,
+                           retries=self.listing_retries if retries is None else retries,
+                           retry_on=(gcs.TransientError,))
+
+    def walk(self, path):
+        padded = path if path[-1] == '/' else path+'/'
+        if self.bulk_listing:
+            return gcs.listbucket(padded)
+        if self.max_concurrency <= 1:
+            return super(GCStorage, self).walk(path)
+        # Flat listings of the top level directories are paginated independently, and can thus run in parallel
+        top = list(gcs.listbucket(padded, delimiter='/'))
+        listings = self.map(lambda stat: list(gcs.listbucket(stat.filename)), [stat for stat in top if stat.is_dir])
+        return sorted(itertools.chain([stat for stat in top if not stat.is_dir], *listings),
+                      key=lambda stat: stat.filename)
+
+    @_gcs_not_found
+    def read(self, path, buffer_size=DEFAULT_BUFFER_SIZE, offset=0):
+        return gcs.open(path, read_buffer_size=buffer_size, offset=offset)
+
+    @_gcs_not_found
+    def stat(self, path):
+        return gcs.stat(path)
 
     def write(self, path, content):
         write_retry_params = gcs.RetryParams(backoff_factor=1.1)
         gcs_file = gcs.open(path, 'w', options={'x-goog-acl': self.acl}, retry_params=write_retry_params)
-        gcs_file.write(content)
+        digests = _write_chunks(gcs_file, content, DEFAULT_BUFFER_SIZE)
         gcs_file.close()
+        return digests
+
+    @_gcs_not_found
+    def delete(self, path):
+        gcs.delete(path)
+
+    def signed_url(self, path, expires_in):
+        if self.signer is None:
+            self.signer = AppIdentitySigner()
+        return signed_url(path, expires_in, self.signer)
 
     def file_exists(self, path):
         match = list(gcs.listbucket(path.rstrip('/')))
@@ -157,3 +462,318 @@ class GCStorage(Storage):
     def path_exists(self, path):
         match = list(gcs.listbucket(path.rstrip('/'), delimiter='/'))
         return path.rstrip('/') in [stat.filename.rstrip('/') for stat in match]
+
+
+class LocalStorage(Storage):
+    """
+    Implementation of the Storage abstract class for a directory tree on a local file system, laid out like the
+    bucket. Files are written to a temporary file first and renamed into place, so readers never observe partial
+    files. Reads are memory-mapped.
+    """
+    # The directory tree is private to the instance (or machine)
+    shared = False
+
+    def __init__(self, root):
+        """
+        :param root: directory holding the packages and index folders, created when needed
+        """
+        self.root = os.path.abspath(root).rstrip('/')
+
+    def get_packages_path(self):
+        return '{0}/packages'.format(self.root)
+
+    def get_package_path(self, package, version=None, filename=None):
+        path = '{0}/{1}'.format(self.get_packages_path(), package)
+        if version:
+            path = '{0}/{1}'.format(path, version)
+            if filename:
+                path = '{0}/{1}'.format(path, filename)
+        return path
+
+    def get_index_path(self, filename=None):
+        path = '{0}/index'.format(self.root)
+        if filename:
+            path = '{0}/{1}'.format(path, filename)
+        return path
+
+    def split_path(self, path):
+        assert path.startswith(self.get_packages_path())
+        segments = [segment for segment in path[len(self.get_packages_path()):].split('/') if segment]
+        components = ['package', 'version', 'filename']
+        return dict(zip(components, segments))
+
+    def ls(self, path, dir_only=False):
+        padded = path if path[-1] == '/' else path+'/'
+        # Temporary files of writes in progress are hidden
+        entries = sorted((entry for entry in _scandir(padded) if not entry.name.startswith('.')),
+                         key=lambda entry: entry.name)
+        return [padded + entry.name + '/' if entry.is_dir() else padded + entry.name
+                for entry in entries if not dir_only or entry.is_dir()]
+
+    def walk(self, path):
+        stats = []
+        pending = [path.rstrip('/')]
+        while pending:
+            for entry in _scandir(pending.pop()):
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir():
+                    pending.append(entry.path)
+                else:
+                    stats.append(LocalFileStat(entry.path, entry.stat()))
+        return sorted(stats, key=lambda stat: stat.filename)
+
+    def empty(self, catalog=None):
+        if catalog is not None:
+            return super(LocalStorage, self).empty(catalog=catalog)
+        return not self.ls(self.get_packages_path())
+
+    @_not_found
+    def read(self, path, buffer_size=DEFAULT_BUFFER_SIZE, offset=0):
+        return _MappedFile(path, offset=offset)
+
+    @_not_found
+    def stat(self, path):
+        return LocalFileStat(path, os.stat(path))
+
+    def write(self, path, content):
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                digests = _write_chunks(temp_file, content, DEFAULT_BUFFER_SIZE)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            os.chmod(temp_path, 0o644)
+            _replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return digests
+
+    @_not_found
+    def delete(self, path):
+        os.remove(path)
+        # Directories only exist as long as they contain files, as in a bucket
+        directory = os.path.dirname(path)
+        while directory.startswith(self.root + '/'):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+    def file_exists(self, path):
+        return os.path.isfile(path.rstrip('/'))
+
+    def path_exists(self, path):
+        return os.path.exists(path.rstrip('/'))
+
+
+class CachingStorage(Storage):
+    """
+    Storage wrapper memoizing the listings and existence queries of another storage in an LRU cache.
+    The cache can be shared between wrappers (and thus requests). Entries affected by a write through a
+    wrapper are invalidated, other changes become visible once the cached entries expire.
+    """
+
+    def __init__(self, storage, cache=None):
+        """
+        :param storage: Storage object to wrap
+        :param cache: LRUCache instance, a private cache is created if omitted
+        """
+        self.storage = storage
+        self.cache = cache if cache is not None else LRUCache(max_size=1024, ttl=60)
+
+    def _cached(self, key, func, *args, **kwargs):
+        value = self.cache.get(key)
+        if value is None:
+            value = func(*args, **kwargs)
+            self.cache.set(key, value)
+        return value
+
+    def _invalidate(self, path):
+        segments = path.rstrip('/').split('/')
+        for i in range(2, len(segments) + 1):
+            prefix = '/'.join(segments[:i])
+            for key in [('ls', prefix + '/', False), ('ls', prefix + '/', True),
+                        ('file_exists', prefix), ('path_exists', prefix)]:
+                self.cache.invalidate(key)
+
+    def stats(self):
+        """
+        :return: dictionary with the number of cached entries, hits and misses
+        """
+        return self.cache.stats()
+
+    @property
+    def shared(self):
+        return self.storage.shared
+
+    def get_packages_path(self):
+        return self.storage.get_packages_path()
+
+    def get_package_path(self, package, version=None, filename=None):
+        return self.storage.get_package_path(package, version, filename)
+
+    def get_index_path(self, filename=None):
+        return self.storage.get_index_path(filename)
+
+    def split_path(self, path):
+        return self.storage.split_path(path)
+
+    def ls(self, path, dir_only=False):
+        padded = path if path[-1] == '/' else path+'/'
+        return list(self._cached(('ls', padded, dir_only), self.storage.ls, padded, dir_only=dir_only))
+
+    def map(self, func, items, retries=None):
+        return self.storage.map(func, items, retries=retries)
+
+    def ls_many(self, paths, dir_only=False):
+        padded = [path if path[-1] == '/' else path+'/' for path in paths]
+        listings = [self.cache.get(('ls', path, dir_only)) for path in padded]
+        missing = [path for path, listing in zip(padded, listings) if listing is None]
+        fetched = dict(zip(missing, self.storage.ls_many(missing, dir_only=dir_only)))
+        for path, listing in six.iteritems(fetched):
+            self.cache.set(('ls', path, dir_only), listing)
+        return [list(listing if listing is not None else fetched[path]) for path, listing in zip(padded, listings)]
+
+    def read(self, path, buffer_size=DEFAULT_BUFFER_SIZE, offset=0):
+        return self.storage.read(path, buffer_size=buffer_size, offset=offset)
+
+    def iter_read(self, path, buffer_size=DEFAULT_BUFFER_SIZE, offset=0, length=None, etag=None):
+        return self.storage.iter_read(path, buffer_size=buffer_size, offset=offset, length=length, etag=etag)
+
+    def stat(self, path):
+        return self.storage.stat(path)
+
+    def walk(self, path):
+        return self.storage.walk(path)
+
+    def empty(self, catalog=None):
+        return self.storage.empty(catalog=catalog)
+
+    def signed_url(self, path, expires_in):
+        return self.storage.signed_url(path, expires_in)
+
+    def write(self, path, content):
+        try:
+            return self.storage.write(path, content)
+        finally:
+            self._invalidate(path)
+
+    def delete(self, path):
+        try:
+            self.storage.delete(path)
+        finally:
+            self._invalidate(path)
+
+    def file_exists(self, path):
+        return self._cached(('file_exists', path.rstrip('/')), self.storage.file_exists, path)
+
+    def path_exists(self, path):
+        return self._cached(('path_exists', path.rstrip('/')), self.storage.path_exists, path)
+
+
+class DiskCachingStorage(Storage):
+    """
+    Storage wrapper keeping the content of package files read from another storage in a DiskCache, so frequently
+    downloaded files are served from local disk. Entries are keyed by path and etag, which is queried from the
+    wrapped storage on every read unless the caller passes it (e.g. from the stat preceding a download): a file
+    replaced or deleted in the wrapped storage (by any instance) is thus never served from an outdated entry.
+    Files are cached while they are first read completely with iter_read.
+    Other files (e.g., the catalog) are read from the wrapped storage directly.
+    """
+
+    def __init__(self, storage, cache):
+        """
+        :param storage: Storage object to wrap
+        :param cache: DiskCache instance, can be shared between wrappers
+        """
+        self.storage = storage
+        self.cache = cache
+
+    def _cacheable(self, path):
+        return path.startswith(self.get_packages_path() + '/')
+
+    def stats(self):
+        """
+        :return: dictionary with the number of cached files, their size in bytes, hits, misses, evictions and
+                 hit rate
+        """
+        return self.cache.stats()
+
+    @property
+    def shared(self):
+        return self.storage.shared
+
+    def get_packages_path(self):
+        return self.storage.get_packages_path()
+
+    def get_package_path(self, package, version=None, filename=None):
+        return self.storage.get_package_path(package, version, filename)
+
+    def get_index_path(self, filename=None):
+        return self.storage.get_index_path(filename)
+
+    def split_path(self, path):
+        return self.storage.split_path(path)
+
+    def ls(self, path, dir_only=False):
+        return self.storage.ls(path, dir_only=dir_only)
+
+    def map(self, func, items, retries=None):
+        return self.storage.map(func, items, retries=retries)
+
+    def ls_many(self, paths, dir_only=False):
+        return self.storage.ls_many(paths, dir_only=dir_only)
+
+    def read(self, path, buffer_size=DEFAULT_BUFFER_SIZE, offset=0):
+        if self._cacheable(path):
+            cached = self.cache.open((path, self.storage.stat(path).etag), offset)
+            if cached is not None:
+                return cached
+        return self.storage.read(path, buffer_size=buffer_size, offset=offset)
+
+    def iter_read(self, path, buffer_size=DEFAULT_BUFFER_SIZE, offset=0, length=None, etag=None):
+        if not self._cacheable(path):
+            return self.storage.iter_read(path, buffer_size=buffer_size, offset=offset, length=length, etag=etag)
+        stat = self.storage.stat(path) if etag is None else None
+        key = (path, stat.etag if stat is not None else etag)
+        cached = self.cache.open(key, offset)
+        if cached is not None:
+            return _iter_chunks(cached, buffer_size, length)
+        stat = stat if stat is not None else self.storage.stat(path)
+        if offset == 0 and (length is None or length >= stat.st_size) and stat.st_size <= self.cache.max_bytes:
+            # Served from the wrapped storage while it is written to the cache, so the first read is not delayed
+            return self.cache.fill(key, self.storage.iter_read(path, buffer_size=buffer_size))
+        return self.storage.iter_read(path, buffer_size=buffer_size, offset=offset, length=length)
+
+    def stat(self, path):
+        return self.storage.stat(path)
+
+    def walk(self, path):
+        return self.storage.walk(path)
+
+    def empty(self, catalog=None):
+        return self.storage.empty(catalog=catalog)
+
+    def signed_url(self, path, expires_in):
+        return self.storage.signed_url(path, expires_in)
+
+    def write(self, path, content):
+        return self.storage.write(path, content)
+
+    def delete(self, path):
+        self.storage.delete(path)
+
+    def file_exists(self, path):
+        return self.storage.file_exists(path)
+
+    def path_exists(self, path):
+        return self.storage.path_exists(path)
@@ -14,10 +14,122 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+
+"""
+Jinja2 environment of the templates of GAEPyPI.
+
+Parsing and compiling templates takes a significant part of the first requests served by an instance. To avoid
+this, compile the templates to Python modules before deploying, with the Jinja2 version used by the application:
+
+    python gaepypi/templates.py
+
+Templates which were not compiled (or changed since) are compiled on first use, with the resulting bytecode
+shared between instances through memcache.
+"""
+
 import os
+import sys
+import json
+import hashlib
 import jinja2
 
-__templates__ = jinja2.Environment(loader=jinja2.FileSystemLoader(
-    os.path.join(os.path.dirname(__file__), 'templates')),
-    extensions=['jinja2.ext.autoescape'],
-    autoescape=True)
\ No newline at end of file
+from ._version import __version__
+
+TEMPLATES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+COMPILED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates_compiled')
+MANIFEST_FILE = 'manifest.json'
+
+_templates_checksum = None
+
+
+def _checksum(name):
+    with open(os.path.join(TEMPLATES_PATH, name), 'rb') as template_file:
+        return hashlib.sha1(template_file.read()).hexdigest()
+
+
+def templates_checksum():
+    """
+    Checksum of the sources of all templates and the version of GAEPyPI. Unlike the deployment, it only changes
+    when the rendered pages may change, so it keys content stored across deployments.
+    """
+    global _templates_checksum
+    if _templates_checksum is None:
+        names = sorted(jinja2.FileSystemLoader(TEMPLATES_PATH).list_templates())
+        digest = hashlib.sha1(' '.join('{0}:{1}'.format(name, _checksum(name)) for name in names).encode('utf-8'))
+        _templates_checksum = '{0}-{1}'.format(__version__, digest.hexdigest()[:16])
+    return _templates_checksum
+
+
+def _compiler():
+    # Compiled templates are only valid for the Jinja2 and Python version that produced them
+    return '{0}-py{1}'.format(jinja2.__version__, sys.version_info[0])
+
+
+class CompiledLoader(jinja2.ModuleLoader):
+    """
+    Loader of the templates compiled by compile_templates. Templates whose source changed since, or which were
+    compiled by a different Jinja2 or Python version, are reported as not found, so a ChoiceLoader falls back
+    to the next loader.
+    """
+
+    def __init__(self, path):
+        super(CompiledLoader, self).__init__(path)
+        with open(os.path.join(path, MANIFEST_FILE)) as manifest_file:
+            manifest = json.load(manifest_file)
+        self.checksums = manifest['checksums'] if manifest.get('compiler') == _compiler() else {}
+
+    def list_templates(self):
+        return sorted(self.checksums)
+
+    def load(self, environment, name, globals=None):
+        if name not in self.checksums or self.checksums[name] != _checksum(name):
+            raise jinja2.TemplateNotFound(name)
+        return super(CompiledLoader, self).load(environment, name, globals)
+
+
+def _environment(loader, bytecode_cache=None):
+    return jinja2.Environment(loader=loader,
+                              extensions=['jinja2.ext.autoescape'],
+                              autoescape=True,
+                              bytecode_cache=bytecode_cache)
+
+
+def _bytecode_cache():
+    # Imported on first use (memcache errors, including a missing App Engine SDK, are ignored by the cache)
+    from ._appengine import memcache
+    return jinja2.MemcachedBytecodeCache(memcache, prefix='gaepypi:jinja2:')
+
+
+def create_environment(compiled_path=COMPILED_PATH, bytecode_cache=None):
+    """
+    :param compiled_path: directory holding the compiled templates, templates are compiled on first use if None
+                          or if the directory was not created by compile_templates
+    :param bytecode_cache: jinja2.BytecodeCache for templates compiled on first use
+    :return: jinja2.Environment
+    """
+    loader = jinja2.FileSystemLoader(TEMPLATES_PATH)
+    if compiled_path is not None and os.path.exists(os.path.join(compiled_path, MANIFEST_FILE)):
+        loader = jinja2.ChoiceLoader([CompiledLoader(compiled_path), loader])
+    return _environment(loader, bytecode_cache)
+
+
+def compile_templates(target=COMPILED_PATH):
+    """
+    Compile all templates to Python modules, to be loaded by CompiledLoader
+    :param target: directory to write the modules to
+    :return: number of compiled templates
+    """
+    environment = _environment(jinja2.FileSystemLoader(TEMPLATES_PATH))
+    names = environment.list_templates()
+    environment.compile_templates(target, zip=None, ignore_errors=False)
+    with open(os.path.join(target, MANIFEST_FILE), 'w') as manifest_file:
+        json.dump({'compiler': _compiler(), 'checksums': dict((name, _checksum(name)) for name in names)},
+                  manifest_file, indent=2, separators=(',', ': '), sort_keys=True)
+    return len(names)
+
+
+if __name__ == '__main__':
+    print('Compiled {0} templates to {1}'.format(compile_templates(*sys.argv[1:]), sys.argv[1] if sys.argv[1:]
+                                                 else COMPILED_PATH))
+else:
+    __templates__ = create_environment(bytecode_cache=_bytecode_cache())
@@ -24,8 +24,13 @@ app = webapp2.WSGIApplication([
     ('/pypi/', PypiHandler),
     ('/pypi/([^/]+)/', PypiPackageHandler),
     ('/pypi/([^/]+)/([^/]+)', PackageVersionHandler),
+    ('/simple/', SimpleIndexHandler),
+    ('/simple/([^/]+)/', SimpleProjectHandler),
     ('/packages', PackageBase),
     ('/packages/([^/]+)', PackageList),
+    ('/packages/([^/]+)/latest', PackageLatest),
     ('/packages/([^/]+)/([^/]+)', PackageVersionHandler),
-    ('/packages/([^/]+)/([^/]+)/(.+)', PackageDownload)
+    ('/packages/([^/]+)/([^/]+)/(.+)', PackageDownload),
+    ('/admin/rebuild-catalog', RebuildCatalogHandler),
+    ('/admin/tasks/index', IndexTaskHandler)
 ], debug=True)
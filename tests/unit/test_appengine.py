@@ -0,0 +1,24 @@
+from gaepypi import pagecache
+from gaepypi._appengine import LazyModule, available
+import json
+import mock
+import unittest
+
+
+class TestLazyModule(unittest.TestCase):
+
+    def test_import_on_access(self):
+        setup = mock.Mock()
+        module = LazyModule('json', setup=setup)
+        setup.assert_not_called()
+        assert module.dumps({}) == '{}'
+        assert module.loads('[]') == []
+        setup.assert_called_once_with(json)
+
+    def test_available(self):
+        assert available(LazyModule('json'))
+        assert not available(LazyModule('gaepypi_no_such_module'))
+        self.assertRaises(ImportError, getattr, LazyModule('gaepypi_no_such_module'), 'attribute')
+
+    def test_memcache_deferred(self):
+        assert isinstance(pagecache.memcache, LazyModule)
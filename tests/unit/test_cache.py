@@ -0,0 +1,137 @@
+from gaepypi._cache import LRUCache, DiskCache
+import tempfile
+import unittest
+import shutil
+import mock
+import os
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = LRUCache(2, ttl=10, clock=self.clock)
+
+    def test_get_set(self):
+        assert self.cache.get('a') is None
+        assert self.cache.get('a', 'default') == 'default'
+        self.cache.set('a', 1)
+        assert self.cache.get('a') == 1
+        assert self.cache.stats() == {'size': 1, 'hits': 1, 'misses': 2}
+
+    def test_eviction(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        assert len(self.cache) == 2
+        assert self.cache.get('b') is None
+        assert self.cache.get('a') == 1
+        assert self.cache.get('c') == 3
+
+    def test_expiry(self):
+        self.cache.set('a', 1)
+        self.clock.now = 9
+        assert self.cache.get('a') == 1
+        self.clock.now = 10
+        assert self.cache.get('a') is None
+        assert len(self.cache) == 0
+
+    def test_no_expiry(self):
+        cache = LRUCache(2, clock=self.clock)
+        cache.set('a', 1)
+        self.clock.now = 1e9
+        assert cache.get('a') == 1
+
+    def test_invalidate(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.invalidate('a')
+        self.cache.invalidate('z')
+        assert self.cache.get('a') is None
+        self.cache.clear()
+        assert len(self.cache) == 0
+
+
+class TestDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = DiskCache(self.directory, 10)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _read(self, key, offset=0):
+        file_obj = self.cache.open(key, offset)
+        if file_obj is None:
+            return None
+        with file_obj:
+            return file_obj.read()
+
+    def test_put_open(self):
+        assert self._read(('a', '1')) is None
+        assert self.cache.put(('a', '1'), [b'con', b'tent'])
+        assert self._read(('a', '1')) == b'content'
+        assert self._read(('a', '1'), offset=3) == b'tent'
+        assert self._read(('a', '2')) is None
+        assert self.cache.stats() == {'size': 1, 'bytes': 7, 'hits': 2, 'misses': 2, 'evictions': 0,
+                                      'hit_rate': 0.5}
+
+    def test_eviction(self):
+        self.cache.put('a', [b'aaaa'])
+        self.cache.put('b', [b'bbbb'])
+        self._read('a')
+        self.cache.put('c', [b'cccc'])
+        assert self._read('b') is None
+        assert self._read('a') == b'aaaa'
+        assert self._read('c') == b'cccc'
+        assert self.cache.stats()['evictions'] == 1
+        assert self.cache.stats()['bytes'] == 8
+        assert len(os.listdir(self.directory)) == 2
+
+    def test_too_large(self):
+        assert not self.cache.put('a', [b'123456', b'789012'])
+        assert self._read('a') is None
+        assert os.listdir(self.directory) == []
+
+    def test_source_closed(self):
+        source = mock.MagicMock()
+        source.__iter__.return_value = iter([b'123456', b'789012'])
+        assert not self.cache.put('a', source)
+        source.close.assert_called_once_with()
+
+    def test_fill(self):
+        chunks = self.cache.fill('a', iter([b'con', b'tent']))
+        assert next(chunks) == b'con'
+        assert self._read('a') is None
+        assert list(chunks) == [b'tent']
+        assert self._read('a') == b'content'
+        # Too large, passed on but not stored
+        assert list(self.cache.fill('b', [b'123456', b'789012'])) == [b'123456', b'789012']
+        assert self._read('b') is None
+        assert len(os.listdir(self.directory)) == 1
+
+    def test_replace(self):
+        self.cache.put('a', [b'aaaa'])
+        self.cache.put('a', [b'aa'])
+        assert self._read('a') == b'aa'
+        assert self.cache.stats()['bytes'] == 2
+
+    def test_adopt(self):
+        self.cache.put('a', [b'aaaa'])
+        with open(os.path.join(self.directory, '.partial'), 'wb') as f:
+            f.write(b'x')
+        cache = DiskCache(self.directory, 10)
+        assert cache.stats()['bytes'] == 4
+        with cache.open('a') as f:
+            assert f.read() == b'aaaa'
+        assert len(os.listdir(self.directory)) == 1
@@ -0,0 +1,88 @@
+from gaepypi import CachingStorage
+from gaepypi._cache import LRUCache
+import mock
+import unittest
+
+
+class TestCachingStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = mock.Mock()
+        self.storage.ls = mock.Mock(return_value=['/mybucket/packages/dummy/'])
+        self.storage.file_exists = mock.Mock(return_value=False)
+        self.storage.path_exists = mock.Mock(return_value=True)
+        self.cache = LRUCache(10, ttl=60)
+        self.s = CachingStorage(self.storage, self.cache)
+
+    def test_ls_cached(self):
+        assert self.s.ls('/mybucket/packages') == ['/mybucket/packages/dummy/']
+        assert self.s.ls('/mybucket/packages/') == ['/mybucket/packages/dummy/']
+        self.storage.ls.assert_called_once_with('/mybucket/packages/', dir_only=False)
+        assert self.s.stats() == {'size': 1, 'hits': 1, 'misses': 1}
+
+        self.s.ls('/mybucket/packages', dir_only=True)
+        self.storage.ls.assert_called_with('/mybucket/packages/', dir_only=True)
+        assert self.storage.ls.call_count == 2
+
+    def test_ls_many(self):
+        self.s.ls('/mybucket/packages/a')
+        self.storage.ls_many = mock.Mock(return_value=[['/mybucket/packages/b/0.1/']])
+        assert self.s.ls_many(['/mybucket/packages/a', '/mybucket/packages/b/']) == [['/mybucket/packages/dummy/'],
+                                                                                    ['/mybucket/packages/b/0.1/']]
+        self.storage.ls_many.assert_called_once_with(['/mybucket/packages/b/'], dir_only=False)
+        assert self.s.ls('/mybucket/packages/b') == ['/mybucket/packages/b/0.1/']
+        assert self.storage.ls.call_count == 1
+
+    def test_exists_cached(self):
+        assert not self.s.file_exists('/mybucket/packages/dummy/0.0.1/a.whl')
+        assert not self.s.file_exists('/mybucket/packages/dummy/0.0.1/a.whl')
+        assert self.s.path_exists('/mybucket/packages/dummy/')
+        assert self.s.path_exists('/mybucket/packages/dummy')
+        self.storage.file_exists.assert_called_once_with('/mybucket/packages/dummy/0.0.1/a.whl')
+        self.storage.path_exists.assert_called_once_with('/mybucket/packages/dummy/')
+
+    def test_shared_cache(self):
+        self.s.ls('/mybucket/packages')
+        CachingStorage(self.storage, self.cache).ls('/mybucket/packages')
+        assert self.storage.ls.call_count == 1
+
+    def test_delete_invalidates(self):
+        self.s.ls('/mybucket/index/pages')
+        self.s.delete('/mybucket/index/pages/a.html')
+        self.storage.delete.assert_called_with('/mybucket/index/pages/a.html')
+        self.s.ls('/mybucket/index/pages')
+        assert self.storage.ls.call_count == 2
+
+    def test_write_invalidates(self):
+        self.s.ls('/mybucket/packages', dir_only=True)
+        self.s.ls('/mybucket/packages/dummy/0.0.1')
+        self.s.ls('/mybucket/packages/other')
+        self.s.file_exists('/mybucket/packages/dummy/0.0.1/a.whl')
+        self.s.path_exists('/mybucket/packages/dummy')
+        assert self.storage.ls.call_count == 3
+
+        self.s.write('/mybucket/packages/dummy/0.0.1/a.whl', 'content')
+        self.storage.write.assert_called_with('/mybucket/packages/dummy/0.0.1/a.whl', 'content')
+
+        self.s.ls('/mybucket/packages', dir_only=True)
+        self.s.ls('/mybucket/packages/dummy/0.0.1')
+        self.s.ls('/mybucket/packages/other')
+        self.s.file_exists('/mybucket/packages/dummy/0.0.1/a.whl')
+        self.s.path_exists('/mybucket/packages/dummy')
+        assert self.storage.ls.call_count == 5
+        assert self.storage.file_exists.call_count == 2
+        assert self.storage.path_exists.call_count == 2
+
+    def test_delegation(self):
+        self.storage.get_package_path = mock.Mock(return_value='path')
+        assert self.s.get_package_path('dummy', '0.0.1') == 'path'
+        self.storage.get_package_path.assert_called_with('dummy', '0.0.1', None)
+        self.s.read('path', buffer_size=10, offset=2)
+        self.storage.read.assert_called_with('path', buffer_size=10, offset=2)
+
+    def test_reads_delegated(self):
+        self.storage.iter_read = mock.Mock(return_value=iter([b'content']))
+        assert list(self.s.iter_read('/mybucket/packages/dummy/0.0.1/a.whl', buffer_size=4, etag='e1')) == [b'content']
+        self.storage.iter_read.assert_called_once_with('/mybucket/packages/dummy/0.0.1/a.whl', buffer_size=4,
+                                                       offset=0, length=None, etag='e1')
+        self.storage.read.assert_not_called()
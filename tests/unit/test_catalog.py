@@ -0,0 +1,134 @@
+from gaepypi import Catalog, PackageIndex
+from gaepypi.catalog import normalize_name
+from gaepypi import NotFoundError
+import json
+import mock
+import unittest
+
+
+class TestCatalog(unittest.TestCase):
+
+    def _storage_mock(self, content=None):
+        storage = mock.Mock()
+        storage.get_index_path = mock.Mock(return_value='/mybucket/index/catalog.json')
+        if content is None:
+            storage.read = mock.Mock(side_effect=NotFoundError)
+        else:
+            storage.read = mock.Mock(return_value=mock.Mock(read=mock.Mock(return_value=json.dumps(content))))
+        return storage
+
+    def test_load(self):
+        storage = self._storage_mock({'packages': {'dummy': {'0.0.1': ['a.whl']}}})
+        catalog = Catalog.load(storage)
+
+        storage.get_index_path.assert_called_with('catalog.json')
+        storage.read.assert_called_with('/mybucket/index/catalog.json')
+        storage.ls.assert_not_called()
+        assert catalog.versions('Dummy') == {'0.0.1': {'a.whl': {}}}
+        assert catalog.files('dummy', '0.0.1') == {'a.whl': {}}
+        assert catalog.files('dummy', '0.0.2') == {}
+        assert catalog.versions('wheel') == {}
+
+    def test_load_missing(self):
+        storage = self._storage_mock()
+        storage.get_packages_path = mock.Mock(return_value='/mybucket/packages')
+        files = ['/mybucket/packages/dummy/0.0.1/b.whl', '/mybucket/packages/dummy/0.0.1/a.whl',
+                 '/mybucket/packages/dummy/0.0.2/c.whl', '/mybucket/packages/stray.txt']
+        storage.walk = mock.Mock(return_value=[mock.Mock(filename=f, st_size=10, st_ctime=1.5) for f in files])
+        storage.split_path = mock.Mock(side_effect=lambda path: dict(zip(['package', 'version', 'filename'],
+                                                                         path.rstrip('/').split('/')[3:])))
+        with mock.patch('gaepypi.maintenance.IndexMaintenance') as maintenance:
+            catalog = Catalog.load(storage)
+            maintenance.return_value.schedule_rebuild.assert_called_once_with()
+            maintenance.reset_mock()
+            Catalog.load(storage, schedule_rebuild=False)
+            maintenance.assert_not_called()
+
+        storage.walk.assert_called_with('/mybucket/packages')
+        storage.ls.assert_not_called()
+        stat = {'size': 10, 'upload_time': 1.5}
+        assert catalog == {'dummy': {'0.0.1': {'a.whl': stat, 'b.whl': stat}, '0.0.2': {'c.whl': stat}}}
+        # The catalog is only written by the index maintenance
+        storage.write.assert_not_called()
+
+    def test_rebuild(self):
+        storage = self._storage_mock()
+        storage.get_packages_path = mock.Mock(return_value='/mybucket/packages')
+        storage.walk = mock.Mock(return_value=[mock.Mock(filename='/mybucket/packages/dummy/0.0.1/a.whl',
+                                                         st_size=10, st_ctime=1.5)])
+        storage.split_path = mock.Mock(side_effect=lambda path: dict(zip(['package', 'version', 'filename'],
+                                                                         path.rstrip('/').split('/')[3:])))
+        catalog = Catalog.rebuild(storage)
+        storage.write.assert_called_with('/mybucket/index/catalog.json',
+                                         json.dumps({'packages': catalog}, sort_keys=True))
+
+    def test_add_file(self):
+        catalog = Catalog(self._storage_mock())
+        catalog.add_file('Dummy', '0.0.1', 'b.whl')
+        catalog.add_file('dummy', '0.0.1', 'a.whl')
+        catalog.add_file('dummy', '0.0.1', 'a.whl')
+        catalog.add_file('dummy', '0.0.2', 'c.whl', sha256='abc')
+
+        assert catalog == {'dummy': {'0.0.1': {'a.whl': {}, 'b.whl': {}}, '0.0.2': {'c.whl': {'sha256': 'abc'}}}}
+
+    def test_rebuild_keeps_metadata(self):
+        storage = self._storage_mock({'packages': {'dummy': {'0.0.1': {'a.whl': {'sha256': 'abc'}}}}})
+        storage.get_packages_path = mock.Mock(return_value='/mybucket/packages')
+        files = ['/mybucket/packages/dummy/0.0.1/a.whl', '/mybucket/packages/dummy/0.0.1/b.whl']
+        storage.walk = mock.Mock(return_value=[mock.Mock(filename=f, st_size=10, st_ctime=1.5) for f in files])
+        storage.split_path = mock.Mock(side_effect=lambda path: dict(zip(['package', 'version', 'filename'],
+                                                                         path.rstrip('/').split('/')[3:])))
+        catalog = Catalog.rebuild(storage)
+
+        assert catalog == {'dummy': {'0.0.1': {'a.whl': {'sha256': 'abc', 'size': 10, 'upload_time': 1.5},
+                                               'b.whl': {'size': 10, 'upload_time': 1.5}}}}
+
+    def test_normalize_name(self):
+        assert normalize_name('Foo.Bar_baz--qux') == 'foo-bar-baz-qux'
+        assert normalize_name('dummy') == 'dummy'
+
+    def test_projects(self):
+        catalog = Catalog(self._storage_mock(), {'my_pkg': {'1.0': {'my_pkg-1.0.whl': {'sha256': 'abc'}}},
+                                                 'my.pkg': {'0.1': {'my.pkg-0.1.tar.gz': {}}},
+                                                 'other': {'2.0': {'other-2.0.whl': {}}}})
+        assert catalog.projects() == {'my-pkg': ['my.pkg', 'my_pkg'], 'other': ['other']}
+        assert [f['filename'] for f in catalog.project_files('my-pkg')] == ['my.pkg-0.1.tar.gz', 'my_pkg-1.0.whl']
+        assert catalog.project_files('unknown') == []
+
+        html = catalog.to_html()
+        assert '/simple/my-pkg/' in html and '/simple/other/' in html
+        html = catalog.to_html('my-pkg')
+        assert '/packages/my_pkg/1.0/my_pkg-1.0.whl#sha256=abc' in html
+        assert '/packages/my.pkg/0.1/my.pkg-0.1.tar.gz"' in html
+
+    def test_digest(self):
+        catalog = Catalog(self._storage_mock(), {'dummy': {'0.0.1': ['a.whl']}, 'wheel': {'1.0': ['c.whl']}})
+        digest, package_digest = catalog.digest(), catalog.digest('dummy')
+        assert digest != package_digest
+
+        catalog.add_file('wheel', '1.1', 'd.whl')
+        assert catalog.digest() != digest
+        assert catalog.digest('Dummy') == package_digest
+
+    def test_get_all(self):
+        storage = self._storage_mock({'packages': {'dummy': {'0.0.1': ['a.whl'], '0.0.2': ['b.whl']},
+                                                   'wheel': {'1.0': ['c.whl']}}})
+        indices = sorted(PackageIndex.get_all(storage))
+
+        storage.ls.assert_not_called()
+        assert [index.name for index in indices] == ['dummy', 'wheel']
+        assert indices[0].size == 2
+        assert indices[0].get_version('0.0.2').files == ('b.whl',)
+
+    def test_to_json(self):
+        catalog = Catalog(self._storage_mock(), {'my_pkg': {'1.0': {'my_pkg-1.0.whl': {'sha256': 'abc', 'size': 10,
+                                                                                       'upload_time': 0.5}}},
+                                                 'my.pkg': {'0.1': {'my.pkg-0.1.tar.gz': {}}}})
+        assert json.loads(catalog.to_json()) == {'meta': {'api-version': '1.1'}, 'projects': [{'name': 'my-pkg'}]}
+        assert json.loads(catalog.to_json('my-pkg')) == {
+            'meta': {'api-version': '1.1'},
+            'name': 'my-pkg',
+            'versions': ['0.1', '1.0'],
+            'files': [{'filename': 'my.pkg-0.1.tar.gz', 'url': '/packages/my.pkg/0.1/my.pkg-0.1.tar.gz', 'hashes': {}},
+                      {'filename': 'my_pkg-1.0.whl', 'url': '/packages/my_pkg/1.0/my_pkg-1.0.whl',
+                       'hashes': {'sha256': 'abc'}, 'size': 10, 'upload-time': '1970-01-01T00:00:00.500000Z'}]}
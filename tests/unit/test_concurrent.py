@@ -0,0 +1,51 @@
+from gaepypi._concurrent import bounded_map
+import threading
+import time
+import unittest
+
+
+class TestBoundedMap(unittest.TestCase):
+
+    def test_order(self):
+        assert bounded_map(lambda x: x * 2, range(20), 4) == [x * 2 for x in range(20)]
+        assert bounded_map(lambda x: x * 2, range(20), 1) == [x * 2 for x in range(20)]
+        assert bounded_map(lambda x: x, [], 4) == []
+
+    def test_bounded(self):
+        lock = threading.Lock()
+        state = {'active': 0, 'peak': 0}
+
+        def task(x):
+            with lock:
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            time.sleep(0.01)
+            with lock:
+                state['active'] -= 1
+            return x
+
+        assert bounded_map(task, range(12), 3) == list(range(12))
+        assert 1 < state['peak'] <= 3
+
+    def test_retry(self):
+        attempts = {}
+
+        def flaky(x):
+            attempts[x] = attempts.get(x, 0) + 1
+            if attempts[x] < 3:
+                raise IOError('transient')
+            return x
+
+        assert bounded_map(flaky, range(4), 2, retries=2, retry_on=(IOError,)) == list(range(4))
+        attempts.clear()
+        with self.assertRaises(IOError):
+            bounded_map(flaky, range(4), 2, retries=1, retry_on=(IOError,))
+
+    def test_error(self):
+        def fail(x):
+            if x == 5:
+                raise ValueError(x)
+            return x
+
+        with self.assertRaises(ValueError):
+            bounded_map(fail, range(10), 3, retries=3, retry_on=(IOError,))
@@ -0,0 +1,87 @@
+from gaepypi import _decorators
+from gaepypi._decorators import basic_auth
+from webapp2_extras import security
+import base64
+import json
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestBasicAuth(unittest.TestCase):
+
+    def _write_config(self, accounts):
+        with open(self.config_file, 'w') as config:
+            json.dump({'accounts': accounts}, config)
+
+    def _handler(self, username=None, password=None):
+        handler = mock.Mock()
+        handler.request.headers = {}
+        handler.response.headers = {}
+        if username:
+            credentials = base64.b64encode('{0}:{1}'.format(username, password))
+            handler.request.headers['Authorization'] = 'Basic ' + credentials
+        return handler
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.tmp, 'config.json')
+        self._write_config([{'username': 'reader', 'password': security.hash_password('secret', method='sha1')},
+                            {'username': 'writer', 'password': security.hash_password('pass:word', method='sha1'),
+                             'roles': ['write']}])
+        patcher = mock.patch('gaepypi._decorators.CONFIG_FILE', self.config_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        _decorators._verified.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_no_credentials(self):
+        handler = self._handler()
+        func = mock.Mock()
+        basic_auth()(func)(handler)
+        func.assert_not_called()
+        handler.response.set_status.assert_called_with(401, message='Authorization Required')
+
+    def test_wrong_password(self):
+        handler = self._handler('reader', 'wrong')
+        func = mock.Mock()
+        basic_auth()(func)(handler)
+        func.assert_not_called()
+        handler.response.set_status.assert_called_with(401, message='Authorization Required')
+
+    def test_forbidden(self):
+        handler = self._handler('reader', 'secret')
+        func = mock.Mock()
+        basic_auth(required_roles=['write'])(func)(handler)
+        func.assert_not_called()
+        handler.response.set_status.assert_called_with(403, message='Forbidden')
+
+    def test_authorized(self):
+        handler = self._handler('writer', 'pass:word')
+        func = mock.Mock(return_value='ok')
+        assert basic_auth(required_roles=['write'])(func)(handler, 'arg') == 'ok'
+        func.assert_called_with(handler, 'arg')
+
+    def test_verified_cached(self):
+        with mock.patch('gaepypi._decorators.security.hash_password', wraps=security.hash_password) as hashing:
+            for _ in range(3):
+                func = mock.Mock()
+                basic_auth()(func)(self._handler('reader', 'secret'))
+                func.assert_called_once()
+            assert hashing.call_count == 1
+
+    def test_config_reloaded(self):
+        func = mock.Mock()
+        basic_auth()(func)(self._handler('reader', 'secret'))
+        assert func.call_count == 1
+
+        self._write_config([])
+        os.utime(self.config_file, (0, 0))
+        handler = self._handler('reader', 'secret')
+        basic_auth()(func)(handler)
+        assert func.call_count == 1
+        handler.response.set_status.assert_called_with(401, message='Authorization Required')
@@ -0,0 +1,110 @@
+from gaepypi import DiskCachingStorage
+from gaepypi._cache import DiskCache
+from gaepypi import NotFoundError
+from io import BytesIO
+import tempfile
+import unittest
+import shutil
+import mock
+
+
+class TestDiskCachingStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.storage = mock.Mock()
+        self.storage.get_packages_path = mock.Mock(return_value='/mybucket/packages')
+        self.storage.stat = mock.Mock(return_value=mock.Mock(etag='e1', st_size=7))
+        self.storage.iter_read = mock.Mock(side_effect=lambda path, buffer_size, offset=0, length=None:
+                                           iter([b'content'[offset:][:length]] if offset else [b'con', b'tent']))
+        self.storage.read = mock.Mock(side_effect=lambda path, buffer_size, offset: BytesIO(b'content'[offset:]))
+        self.cache = DiskCache(self.directory, 100)
+        self.s = DiskCachingStorage(self.storage, self.cache)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _read(self, path, offset=0):
+        f = self.s.read(path, offset=offset)
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def _iter_read(self, path, offset=0, length=None):
+        return b''.join(self.s.iter_read(path, buffer_size=4, offset=offset, length=length))
+
+    def test_read_through(self):
+        path = '/mybucket/packages/dummy/0.0.1/a.whl'
+        assert self._iter_read(path) == b'content'
+        assert self._iter_read(path, offset=3) == b'tent'
+        assert self._iter_read(path, offset=1, length=2) == b'on'
+        assert self._read(path, offset=3) == b'tent'
+        assert self.storage.iter_read.call_count == 1
+        self.storage.read.assert_not_called()
+        assert self.s.stats()['hits'] == 3
+
+    def test_known_etag(self):
+        # A hit costs no query of the wrapped storage if the etag is known, a miss queries the size
+        path = '/mybucket/packages/dummy/0.0.1/a.whl'
+        assert b''.join(self.s.iter_read(path, buffer_size=4, etag='e1')) == b'content'
+        assert self.storage.stat.call_count == 1
+        assert b''.join(self.s.iter_read(path, buffer_size=4, offset=3, etag='e1')) == b'tent'
+        assert self.storage.stat.call_count == 1
+        assert self.s.stats()['hits'] == 1
+
+    def test_streamed_on_miss(self):
+        path = '/mybucket/packages/dummy/0.0.1/a.whl'
+        chunks = self.s.iter_read(path, buffer_size=4)
+        # The first chunk is served before the file is cached
+        assert next(chunks) == b'con'
+        assert len(self.cache) == 0
+        assert list(chunks) == [b'tent']
+        assert len(self.cache) == 1
+
+    def test_abandoned(self):
+        source = mock.MagicMock()
+        source.__iter__.return_value = iter([b'con', b'tent'])
+        self.storage.iter_read = mock.Mock(return_value=source)
+        chunks = self.s.iter_read('/mybucket/packages/dummy/0.0.1/a.whl', buffer_size=4)
+        assert next(chunks) == b'con'
+        chunks.close()
+        source.close.assert_called_once_with()
+        assert len(self.cache) == 0
+
+    def test_read_miss(self):
+        # Files are only cached when read completely with iter_read
+        path = '/mybucket/packages/dummy/0.0.1/a.whl'
+        assert self._read(path, offset=1) == b'ontent'
+        assert self._iter_read(path, offset=1) == b'ontent'
+        self.storage.iter_read.assert_called_with(path, buffer_size=4, offset=1, length=None)
+        assert len(self.cache) == 0
+
+    def test_etag_changed(self):
+        path = '/mybucket/packages/dummy/0.0.1/a.whl'
+        self._iter_read(path)
+        self.s.write(path, b'other')
+        self.storage.stat.return_value = mock.Mock(etag='e2', st_size=7)
+        self._iter_read(path)
+        assert self.storage.iter_read.call_count == 2
+        self.storage.write.assert_called_with(path, b'other')
+
+    def test_deleted(self):
+        # The metadata is queried on every read, deleted files are not served from the cache
+        path = '/mybucket/packages/dummy/0.0.1/a.whl'
+        self._iter_read(path)
+        self.storage.stat.side_effect = NotFoundError()
+        self.assertRaises(NotFoundError, self._iter_read, path)
+        self.assertRaises(NotFoundError, self._read, path)
+
+    def test_too_large(self):
+        self.storage.stat.return_value = mock.Mock(etag='e1', st_size=1000)
+        assert self._iter_read('/mybucket/packages/dummy/0.0.1/a.whl') == b'content'
+        assert len(self.cache) == 0
+
+    def test_not_cacheable(self):
+        assert self._read('/mybucket/index/catalog.json') == b'content'
+        assert self._read('/mybucket/index/catalog.json') == b'content'
+        assert self.storage.read.call_count == 2
+        self.storage.stat.assert_not_called()
+        assert len(self.cache) == 0
@@ -1,6 +1,10 @@
 from google.appengine.ext import testbed
-from gaepypi import GCStorage
-from mock import patch, Mock, PropertyMock
+from gaepypi import GCStorage, NotFoundError
+from gaepypi._signing import LocalSigner
+from mock import patch, call, Mock, PropertyMock
+from io import BytesIO
+import cloudstorage as gcs
+import hashlib
 import unittest
 
 
@@ -26,6 +30,10 @@ class TestGCSStorage(unittest.TestCase):
         assert self.s.get_package_path('dummy', '0.0.1', 'file.txt') == '/mybucket/packages/dummy/0.0.1/file.txt'
 
 
+    def test_index_path(self):
+        assert self.s.get_index_path() == '/mybucket/index'
+        assert self.s.get_index_path('catalog.json') == '/mybucket/index/catalog.json'
+
     def test_split_path(self):
         assert self.s.split_path('/mybucket/packages/dummy') == {'package': 'dummy'}
         assert self.s.split_path('/mybucket/packages/dummy/') == {'package': 'dummy'}
@@ -103,11 +111,135 @@ class TestGCSStorage(unittest.TestCase):
         assert filenames[0] == retrieved[0]
         assert filenames[3] == retrieved[1]
 
+    @patch('gaepypi.storage.gcs.listbucket')
+    def test_empty(self, mock):
+        mock.return_value = iter([])
+        assert self.s.empty()
+        mock.assert_called_once_with('/mybucket/packages/', max_keys=1)
+
+        mock.return_value = iter([Mock()])
+        assert not self.s.empty()
+
+    @patch('gaepypi.storage.gcs.listbucket')
+    def test_empty_catalog(self, mock):
+        assert self.s.empty(catalog={})
+        assert not self.s.empty(catalog={'dummy': {'0.0.1': ['a.whl']}})
+        mock.assert_not_called()
+
+    @patch('gaepypi.storage.gcs.listbucket')
+    def test_walk(self, mock):
+        mock.return_value = ['stat1', 'stat2']
+        assert list(self.s.walk('/mybucket/packages')) == ['stat1', 'stat2']
+        mock.assert_called_once_with('/mybucket/packages/')
+        # Bulk listing is kept regardless of the concurrency
+        mock.reset_mock()
+        assert list(GCStorage('mybucket', max_concurrency=8).walk('/mybucket/packages')) == ['stat1', 'stat2']
+        mock.assert_called_once_with('/mybucket/packages/')
+
+    @patch('gaepypi.storage.gcs.stat')
+    @patch('gaepypi.storage.gcs.listbucket')
+    def test_walk_hierarchical(self, mock, stat):
+        listings = {'/mybucket/packages/': ['/mybucket/packages/dummy/'],
+                    '/mybucket/packages/dummy/': ['/mybucket/packages/dummy/0.0.1/', '/mybucket/packages/dummy/a'],
+                    '/mybucket/packages/dummy/0.0.1/': ['/mybucket/packages/dummy/0.0.1/b']}
+        mock.side_effect = lambda path, delimiter: [Mock(filename=f, is_dir=f.endswith('/')) for f in listings[path]]
+        stat.side_effect = lambda path: 'stat:' + path
+        s = GCStorage('mybucket', bulk_listing=False)
+        assert list(s.walk('/mybucket/packages')) == ['stat:/mybucket/packages/dummy/0.0.1/b',
+                                                      'stat:/mybucket/packages/dummy/a']
+        assert mock.call_count == 3
+
+    @patch('gaepypi.storage.gcs.listbucket')
+    def test_walk_parallel(self, mock):
+        listings = {'/mybucket/packages/': ['/mybucket/packages/b/', '/mybucket/packages/a/', '/mybucket/packages/x'],
+                    '/mybucket/packages/a/': ['/mybucket/packages/a/0.1/a.whl'],
+                    '/mybucket/packages/b/': ['/mybucket/packages/b/0.1/b.whl', '/mybucket/packages/b/0.2/b.whl']}
+        mock.side_effect = lambda path, delimiter=None: [Mock(filename=f, is_dir=f.endswith('/'))
+                                                         for f in listings[path]]
+        s = GCStorage('mybucket', bulk_listing=False, max_concurrency=4)
+        assert [stat.filename for stat in s.walk('/mybucket/packages')] == [
+            '/mybucket/packages/a/0.1/a.whl', '/mybucket/packages/b/0.1/b.whl', '/mybucket/packages/b/0.2/b.whl',
+            '/mybucket/packages/x']
+        mock.assert_has_calls([call('/mybucket/packages/', delimiter='/')])
+        assert mock.call_count == 3
+
+    @patch('gaepypi.storage.gcs.listbucket')
+    def test_ls_many(self, mock):
+        listings = {'/mybucket/packages/a/': ['/mybucket/packages/a/0.1/'],
+                    '/mybucket/packages/b/': ['/mybucket/packages/b/0.1/', '/mybucket/packages/b/0.2/']}
+        failures = ['/mybucket/packages/b/']
+
+        def listbucket(path, delimiter):
+            if path in failures:
+                failures.remove(path)
+                raise gcs.TransientError()
+            return [Mock(filename=f, is_dir=True) for f in listings[path]]
+        mock.side_effect = listbucket
+        s = GCStorage('mybucket', max_concurrency=4)
+        assert s.ls_many(['/mybucket/packages/a', '/mybucket/packages/b']) == [listings['/mybucket/packages/a/'],
+                                                                              listings['/mybucket/packages/b/']]
+        assert mock.call_count == 3
+
+    def test_map_retries(self):
+        calls = []
+
+        def func(item):
+            calls.append(item)
+            raise gcs.TransientError()
+        s = GCStorage('mybucket', max_concurrency=4)
+        self.assertRaises(gcs.TransientError, s.map, func, ['a'])
+        assert len(calls) == 1 + s.listing_retries
+        del calls[:]
+        self.assertRaises(gcs.TransientError, s.map, func, ['a'], retries=0)
+        assert calls == ['a']
+
+    @patch('gaepypi.storage.gcs.delete')
+    def test_delete(self, mock):
+        self.s.delete('/mybucket/index/pages/a.html')
+        mock.assert_called_once_with('/mybucket/index/pages/a.html')
+
     @patch('gaepypi.storage.gcs.open')
     def test_open(self, mock):
         self.s.read('/mybucket/path/a.txt')
+        mock.assert_called_with('/mybucket/path/a.txt', read_buffer_size=1024 * 1024, offset=0)
+
+    @patch('gaepypi.storage.gcs.open')
+    def test_iter_read(self, mock):
+        m = Mock()
+        m.read = Mock(side_effect=['abc', 'de', ''])
+        mock.return_value = m
+        chunks = self.s.iter_read('/mybucket/path/a.txt', buffer_size=3)
+        mock.assert_called_with('/mybucket/path/a.txt', read_buffer_size=3, offset=0)
+        assert list(chunks) == ['abc', 'de']
+        m.read.assert_called_with(3)
+        m.close.assert_called_with()
+
+    @patch('gaepypi.storage.gcs.open')
+    def test_iter_read_range(self, mock):
+        m = Mock()
+        m.read = Mock(side_effect=BytesIO(b'cdefgh').read)
+        mock.return_value = m
+        chunks = self.s.iter_read('/mybucket/path/a.txt', buffer_size=3, offset=2, length=4)
+        mock.assert_called_with('/mybucket/path/a.txt', read_buffer_size=3, offset=2)
+        assert list(chunks) == [b'cde', b'f']
+        m.read.assert_has_calls([call(3), call(1)])
+        m.close.assert_called_with()
+
+    @patch('gaepypi.storage.gcs.stat')
+    def test_stat(self, mock):
+        mock.return_value = 'stat'
+        assert self.s.stat('/mybucket/path/a.txt') == 'stat'
         mock.assert_called_with('/mybucket/path/a.txt')
 
+    @patch('gaepypi.storage.gcs.delete', side_effect=gcs.NotFoundError)
+    @patch('gaepypi.storage.gcs.stat', side_effect=gcs.NotFoundError)
+    @patch('gaepypi.storage.gcs.open', side_effect=gcs.NotFoundError)
+    def test_not_found(self, open, stat, delete):
+        # Reported like for all other storages
+        self.assertRaises(NotFoundError, self.s.read, '/mybucket/path/a.txt')
+        self.assertRaises(NotFoundError, self.s.stat, '/mybucket/path/a.txt')
+        self.assertRaises(NotFoundError, self.s.delete, '/mybucket/path/a.txt')
+
     @patch('gaepypi.storage.gcs.open')
     @patch('gaepypi.storage.gcs.RetryParams')
     def test_write(self, retry, open):
@@ -115,7 +247,37 @@ class TestGCSStorage(unittest.TestCase):
         m = Mock()
         m.write = Mock()
         open.return_value = m
-        self.s.write('/mybucket/path/a.txt', '1111111')
+        digests = self.s.write('/mybucket/path/a.txt', '1111111')
         retry.assert_called_with(backoff_factor=1.1)
         open.assert_called_with('/mybucket/path/a.txt', 'w', options={'x-goog-acl': 'project-private'}, retry_params='rp')
         m.write.assert_called_with('1111111')
+        assert digests == {'md5': hashlib.md5(b'1111111').hexdigest(),
+                           'sha256': hashlib.sha256(b'1111111').hexdigest(),
+                           'size': 7}
+
+    @patch('gaepypi.storage.gcs.open')
+    @patch('gaepypi.storage.DEFAULT_BUFFER_SIZE', 3)
+    def test_write_file(self, open):
+        m = Mock()
+        open.return_value = m
+        digests = self.s.write('/mybucket/path/a.txt', BytesIO(b'1111111'))
+        m.write.assert_has_calls([call(b'111'), call(b'111'), call(b'1')])
+        m.close.assert_called_with()
+        assert digests['sha256'] == hashlib.sha256(b'1111111').hexdigest()
+        assert digests['size'] == 7
+
+    @patch('gaepypi.storage.gcs.open')
+    def test_write_iterable(self, open):
+        m = Mock()
+        open.return_value = m
+        digests = self.s.write('/mybucket/path/a.txt', iter([b'11', b'22']))
+        m.write.assert_has_calls([call(b'11'), call(b'22')])
+        assert digests['md5'] == hashlib.md5(b'1122').hexdigest()
+
+    def test_signed_url(self):
+        s = GCStorage('mybucket', signer=LocalSigner())
+        url = s.signed_url('/mybucket/packages/dummy/0.0.1/a.whl', 300)
+        assert url.startswith('https://storage.googleapis.com/mybucket/packages/dummy/0.0.1/a.whl?')
+        assert 'X-Goog-Expires=300' in url
+        assert 'X-Goog-Credential=local%40localhost%2F' in url
+
@@ -0,0 +1,285 @@
+from gaepypi import _handlers, app, Catalog, GCStorage, LocalStorage, CachingStorage
+from gaepypi._handlers import BaseHandler
+from gaepypi.pagecache import PageCache, LocalCacheClient
+from io import BytesIO
+from webob.multidict import MultiDict
+import webob
+import cloudstorage as gcs
+import unittest
+import tempfile
+import shutil
+import json
+import os
+import webapp2
+import mock
+
+
+class TestBaseHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = mock.Mock()
+        self.storage.get_package_path = mock.Mock(return_value='/mybucket/packages/dummy')
+        self.catalog = Catalog(self.storage, {'dummy': {'0.0.1': {'a.whl': {}}, '0.0.2': {'b.whl': {}}}})
+        self.load = mock.patch('gaepypi._handlers.Catalog.load', return_value=self.catalog).start()
+        self.uncached = mock.Mock()
+        self.uncached.get_index_path = mock.Mock(side_effect=lambda filename: '/mybucket/index/' + filename)
+        self.uncached.walk = mock.Mock(return_value=[])
+        mock.patch('gaepypi._handlers._get_storages', return_value=(self.uncached, self.storage)).start()
+        self.handler = BaseHandler(webapp2.Request.blank('/'), webapp2.Response())
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def test_storage(self):
+        assert self.handler.get_storage() is self.storage
+        assert self.handler.get_storage(cached=False) is not self.storage
+
+    def test_catalog_once(self):
+        assert self.handler.get_catalog() is self.catalog
+        assert self.handler.get_catalog(self.storage) is self.catalog
+        self.load.assert_called_once_with(self.storage)
+        self.uncached.walk.assert_called_once_with('/mybucket/index/pending')
+
+    def test_catalog_pending(self):
+        record = {'name': 'dummy', 'version': '0.0.3', 'filename': 'c.whl', 'size': 3}
+        self.uncached.walk.return_value = [mock.Mock(filename='/mybucket/index/pending/dummy/0.0.3/c.whl.json')]
+        self.uncached.read = mock.Mock(return_value=mock.Mock(read=lambda: json.dumps(record)))
+        assert self.handler.get_package('dummy', '0.0.3').files == ('c.whl',)
+        assert self.handler.get_pending()[0][1] == record
+        self.uncached.walk.assert_called_once_with('/mybucket/index/pending')
+
+    def test_index_reused(self):
+        index = self.handler.get_index('dummy')
+        assert self.handler.get_index('Dummy') is index
+        assert self.handler.get_package('dummy', '0.0.2') is index.get_version('0.0.2')
+        assert self.handler.get_package('dummy', '0.0.3').empty()
+        self.storage.ls.assert_not_called()
+        assert self.load.call_count == 1
+
+    def test_package_reused(self):
+        package = self.handler.get_package('dummy', '0.0.1')
+        assert package.files == ('a.whl',)
+        assert self.handler.get_package('dummy', '0.0.1') is package
+        assert self.load.call_count == 1
+
+    def test_request_scope(self):
+        other = BaseHandler(webapp2.Request.blank('/'), webapp2.Response())
+        assert other.get_index('dummy') is not self.handler.get_index('dummy')
+        assert self.load.call_count == 2
+
+
+class TestStorages(unittest.TestCase):
+
+    def setUp(self):
+        _handlers._storages = None
+
+    def tearDown(self):
+        _handlers._storages = None
+
+    @mock.patch.dict('os.environ', {'BUCKET_NAME': 'mybucket'})
+    @mock.patch('gaepypi._handlers.app_identity.get_default_gcs_bucket_name')
+    def test_created_once(self, bucket_name):
+        storage, caching_storage = _handlers._get_storages()
+        assert storage.bucket == 'mybucket'
+        assert caching_storage.storage is storage
+        assert _handlers._get_storages() == (storage, caching_storage)
+        bucket_name.assert_not_called()
+        assert storage.bulk_listing
+
+    @mock.patch.dict('os.environ', {'BUCKET_NAME': 'mybucket', 'BULK_LISTING': '0', 'LISTING_CONCURRENCY': '4'})
+    def test_listing_configuration(self):
+        storage, _ = _handlers._get_storages()
+        assert not storage.bulk_listing
+        assert storage.max_concurrency == 4
+
+
+class TestListingRoundTrips(unittest.TestCase):
+
+    def setUp(self):
+        storage = GCStorage('mybucket')
+        catalog = json.dumps({'packages': {'dummy': {'0.0.1': {'a.whl': {'size': 1}}}}})
+        self.listbucket = mock.patch('gaepypi.storage.gcs.listbucket', return_value=[]).start()
+        self.open = mock.patch('gaepypi.storage.gcs.open').start()
+        self.open.side_effect = lambda path, **kwargs: self._open(path, catalog)
+        mock.patch('gaepypi._handlers._get_storages', return_value=(storage, CachingStorage(storage))).start()
+        mock.patch('gaepypi._handlers._page_cache', PageCache(LocalCacheClient())).start()
+        mock.patch('gaepypi._decorators.__basic_verify', return_value={'roles': []}).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def _open(self, path, catalog):
+        if path != '/mybucket/index/catalog.json':
+            raise gcs.NotFoundError()
+        return BytesIO(catalog.encode('utf-8'))
+
+    def _get(self, path):
+        return webapp2.Request.blank(path, headers={'Authorization': 'Basic dXNlcjpwYXNz'}).get_response(app)
+
+    def test_pypi_package(self):
+        response = self._get('/pypi/dummy/')
+        assert response.status_int == 200
+        assert 'a.whl' in response.body
+        # Only the pending uploads are listed, the versions and files are read from the catalog
+        self.listbucket.assert_called_once_with('/mybucket/index/pending/')
+        assert self._get('/pypi/other/').status_int == 404
+        assert self.listbucket.call_count == 2
+
+    def test_package_version(self):
+        response = self._get('/packages/dummy/0.0.1')
+        assert response.status_int == 200
+        assert 'a.whl' in response.body
+        self.listbucket.assert_called_once_with('/mybucket/index/pending/')
+        assert self._get('/packages/dummy/0.0.2').status_int == 404
+        assert self.listbucket.call_count == 2
+
+    @mock.patch('gaepypi.storage.gcs.stat')
+    def test_download(self, stat):
+        # Downloads do not read the catalog, the file is looked up in storage directly
+        stat.return_value = mock.Mock(st_size=7, etag='e1', st_ctime=1.0)
+        self.open.side_effect = lambda path, **kwargs: BytesIO(b'content')
+        response = self._get('/packages/dummy/0.0.1/a.whl')
+        assert response.status_int == 200
+        assert response.body == b'content'
+        stat.assert_called_once_with('/mybucket/packages/dummy/0.0.1/a.whl')
+        assert [c[0][0] for c in self.open.call_args_list] == ['/mybucket/packages/dummy/0.0.1/a.whl']
+        self.listbucket.assert_not_called()
+
+        stat.side_effect = gcs.NotFoundError()
+        assert self._get('/packages/dummy/0.0.1/b.whl').status_int == 404
+        assert self._get('/packages/dummy/../a.whl').status_int == 404
+
+
+class TestUpload(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.root = os.path.join(self.directory, 'root')
+        storage = LocalStorage(self.root)
+        mock.patch('gaepypi._handlers._get_storages', return_value=(storage, CachingStorage(storage))).start()
+        mock.patch('gaepypi._decorators.__basic_verify', return_value={'roles': ['write']}).start()
+        mock.patch('gaepypi.maintenance.PageCache').start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+        shutil.rmtree(self.directory)
+
+    def _post(self, action, name, version, *files):
+        post = [('name', name), ('version', version), (':action', action)]
+        post.extend(('content', content) for content in files)
+        request = webapp2.Request.blank('/', POST=MultiDict(post), headers={'Authorization': 'Basic dXNlcjpwYXNz'})
+        return request.get_response(app)
+
+    def _files(self):
+        """
+        :return: package files and files written outside the storage root, relative to the parent of the root
+        """
+        files = sorted(os.path.relpath(os.path.join(path, name), self.directory)
+                       for path, _, names in os.walk(self.directory) for name in names)
+        return [f for f in files if not f.startswith('root/index/')]
+
+    def test_file_upload(self):
+        assert self._post('file_upload', 'dummy', '0.0.1', ('a.whl', b'content')).status_int == 200
+        assert self._files() == ['root/packages/dummy/0.0.1/a.whl']
+
+    def test_path_traversal(self):
+        for name, version, filename in [('..', '..', 'evil.txt'), ('dummy', '..', 'evil.txt'),
+                                        ('dummy', '0.0.1', '../evil.txt'), ('.', '0.0.1', 'evil.txt')]:
+            response = self._post('file_upload', name, version, (filename, b'evil'))
+            assert response.status_int == 400
+            assert self._post('batch_upload', name, version, (filename, b'evil')).status_int in (207, 400)
+        assert self._files() == []
+
+    def test_batch_invalid_filename(self):
+        response = self._post('batch_upload', 'dummy', '0.0.1', ('../a.whl', b'a'), ('b.whl', b'b'))
+        assert response.status_int == 207
+        assert [(f['filename'], f['status']) for f in json.loads(response.body)['files']] == [('../a.whl', 'error'),
+                                                                                           ('b.whl', 'ok')]
+        assert self._files() == ['root/packages/dummy/0.0.1/b.whl']
+
+    def test_empty_upload(self):
+        # Empty files are not stored, as before streaming uploads
+        assert self._post('file_upload', 'dummy', '0.0.1', ('a.whl', b'')).status_int == 200
+        assert self._files() == []
+        response = self._post('batch_upload', 'dummy', '0.0.1', ('a.whl', b''), ('b.whl', b'b'))
+        assert response.status_int == 207
+        assert [f.get('error') for f in json.loads(response.body)['files']] == ['Empty file', None]
+        assert self._files() == ['root/packages/dummy/0.0.1/b.whl']
+
+    def test_duplicate_upload(self):
+        assert self._post('file_upload', 'dummy', '0.0.1', ('a.whl', b'content')).status_int == 200
+        assert self._post('file_upload', 'dummy', '0.0.1', ('a.whl', b'other')).status_int == 403
+        with open(os.path.join(self.root, 'packages', 'dummy', '0.0.1', 'a.whl'), 'rb') as f:
+            assert f.read() == b'content'
+
+
+class TestDownload(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.storage = LocalStorage(self.directory)
+        self.storage.write(self.storage.get_package_path('dummy', '0.0.1', 'a.whl'), b'0123456789')
+        mock.patch('gaepypi._handlers._get_storages',
+                   return_value=(self.storage, CachingStorage(self.storage))).start()
+        mock.patch('gaepypi._decorators.__basic_verify', return_value={'roles': []}).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+        shutil.rmtree(self.directory)
+
+    def _get(self, path='/packages/dummy/0.0.1/a.whl', **headers):
+        headers['Authorization'] = 'Basic dXNlcjpwYXNz'
+        # A webapp2 response would reset the Cache-Control header set by the handler
+        return webob.Request.blank(path, headers=headers).get_response(app)
+
+    def test_download(self):
+        response = self._get()
+        assert response.status_int == 200
+        assert response.body == b'0123456789'
+        assert response.headers['Accept-Ranges'] == 'bytes'
+        assert self._get('/packages/dummy/0.0.1/b.whl').status_int == 404
+
+    def test_not_modified(self):
+        etag = self._get().headers['ETag']
+        response = self._get(**{'If-None-Match': etag})
+        assert response.status_int == 304
+        assert response.body == b''
+
+    def test_range(self):
+        response = self._get(Range='bytes=2-4')
+        assert response.status_int == 206
+        assert response.body == b'234'
+        assert response.headers['Content-Range'] == 'bytes 2-4/10'
+
+        response = self._get(Range='bytes=20-')
+        assert response.status_int == 416
+        assert response.headers['Content-Range'] == 'bytes */10'
+
+    def test_if_range(self):
+        etag = self._get().headers['ETag']
+        response = self._get(Range='bytes=2-4', **{'If-Range': etag})
+        assert response.status_int == 206
+        assert response.body == b'234'
+        # The client's copy is outdated: the full file is served
+        response = self._get(Range='bytes=2-4', **{'If-Range': '"outdated"'})
+        assert response.status_int == 200
+        assert response.body == b'0123456789'
+
+    @mock.patch.dict('os.environ', {'DOWNLOAD_REDIRECT_THRESHOLD': '10', 'DOWNLOAD_URL_EXPIRATION': '60'})
+    def test_redirect(self):
+        with mock.patch.object(self.storage, 'signed_url', return_value='https://storage.example.com/a.whl?sig=x'):
+            response = self._get()
+            assert response.status_int == 302
+            assert response.headers['Location'] == 'https://storage.example.com/a.whl?sig=x'
+            assert response.headers['Cache-Control'] == 'private, no-store'
+            self.storage.signed_url.assert_called_once_with(
+                self.storage.get_package_path('dummy', '0.0.1', 'a.whl'), 60)
+
+    @mock.patch.dict('os.environ', {'DOWNLOAD_REDIRECT_THRESHOLD': '11'})
+    def test_below_threshold(self):
+        # Smaller files, and files of storages without direct access, are served by the application
+        with mock.patch.object(self.storage, 'signed_url') as signed_url:
+            assert self._get().body == b'0123456789'
+            signed_url.assert_not_called()
+        os.environ['DOWNLOAD_REDIRECT_THRESHOLD'] = '1'
+        assert self._get().body == b'0123456789'
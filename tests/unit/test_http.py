@@ -0,0 +1,73 @@
+from gaepypi import RangeNotSatisfiable
+from gaepypi._http import byte_range, if_range_matches, is_not_modified, http_date, parse_http_date, \
+    accepts_encoding, gzip_compress
+import gzip
+from io import BytesIO
+import unittest
+
+
+class TestHttp(unittest.TestCase):
+
+    def test_http_date(self):
+        assert http_date(784111777) == 'Sun, 06 Nov 1994 08:49:37 GMT'
+        assert parse_http_date('Sun, 06 Nov 1994 08:49:37 GMT') == 784111777
+        assert parse_http_date('yesterday') is None
+        assert parse_http_date(None) is None
+
+    def test_byte_range(self):
+        assert byte_range(None, 100) is None
+        assert byte_range('bytes=0-9', 100) == (0, 10)
+        assert byte_range('bytes=10-', 100) == (10, 100)
+        assert byte_range('bytes=90-200', 100) == (90, 100)
+        assert byte_range('bytes=-10', 100) == (90, 100)
+        assert byte_range('bytes=-200', 100) == (0, 100)
+
+    def test_byte_range_ignored(self):
+        assert byte_range('bytes=0-9,20-29', 100) is None
+        assert byte_range('bytes=-', 100) is None
+        assert byte_range('items=0-9', 100) is None
+
+    def test_byte_range_not_satisfiable(self):
+        with self.assertRaises(RangeNotSatisfiable):
+            byte_range('bytes=100-', 100)
+        with self.assertRaises(RangeNotSatisfiable):
+            byte_range('bytes=20-10', 100)
+        with self.assertRaises(RangeNotSatisfiable):
+            byte_range('bytes=-0', 100)
+
+    def test_if_range(self):
+        assert if_range_matches(None, 'abc', 784111777)
+        assert if_range_matches('"abc"', 'abc', 784111777)
+        assert not if_range_matches('"abd"', 'abc', 784111777)
+        assert not if_range_matches('W/"abc"', 'abc', 784111777)
+        assert if_range_matches('Sun, 06 Nov 1994 08:49:37 GMT', 'abc', 784111777.5)
+        assert not if_range_matches('Sun, 06 Nov 1994 08:49:38 GMT', 'abc', 784111777)
+
+    def test_not_modified_etag(self):
+        assert is_not_modified('"abc"', None, 'abc')
+        assert is_not_modified('"xyz", W/"abc"', None, 'abc')
+        assert is_not_modified('*', None, 'abc')
+        assert not is_not_modified('"xyz"', None, 'abc')
+        assert not is_not_modified('"xyz"', 'Sun, 06 Nov 1994 08:49:37 GMT', 'abc', 784111777)
+
+    def test_not_modified_date(self):
+        assert is_not_modified(None, 'Sun, 06 Nov 1994 08:49:37 GMT', 'abc', 784111777)
+        assert is_not_modified(None, 'Sun, 06 Nov 1994 08:49:38 GMT', 'abc', 784111777.5)
+        assert not is_not_modified(None, 'Sun, 06 Nov 1994 08:49:36 GMT', 'abc', 784111777)
+        assert not is_not_modified(None, 'Sun, 06 Nov 1994 08:49:37 GMT', 'abc')
+        assert not is_not_modified(None, 'yesterday', 'abc', 784111777)
+        assert not is_not_modified(None, None, 'abc', 784111777)
+
+    def test_accepts_encoding(self):
+        assert accepts_encoding('gzip, deflate', 'gzip')
+        assert accepts_encoding('deflate, gzip;q=0.5', 'gzip')
+        assert accepts_encoding('*', 'gzip')
+        assert not accepts_encoding('gzip;q=0', 'gzip')
+        assert not accepts_encoding('deflate', 'gzip')
+        assert not accepts_encoding(None, 'gzip')
+
+    def test_gzip_compress(self):
+        compressed = gzip_compress(b'abc' * 100)
+        assert compressed == gzip_compress(b'abc' * 100)
+        assert len(compressed) < 300
+        assert gzip.GzipFile(fileobj=BytesIO(compressed)).read() == b'abc' * 100
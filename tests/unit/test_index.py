@@ -1,20 +1,8 @@
-from gaepypi import Package, PackageIndex, GAEPyPIError
+from gaepypi import Package, PackageIndex, GAEPyPIError, GCStorage
 import mock
 import unittest
 
 
-class ResponseList(object):
-    def __init__(self, *args):
-        super(ResponseList, self).__init__()
-        self.responses = args
-        self._counter = 0
-
-    def __call__(self, *args, **kwargs):
-        val = self.responses[self._counter % len(self.responses)]
-        self._counter += 1
-        return val
-
-
 class TestPackageIndex(unittest.TestCase):
 
     def _storage_mock(self, name, version, files):
@@ -30,30 +18,22 @@ class TestPackageIndex(unittest.TestCase):
         # Prepare storage interactions
         self.storage = mock.Mock()
         path = '/mybucket/packages/dummy'
-        self.storage.get_package_path = mock.Mock(side_effect=ResponseList(path, path + '/0.0.1', path + '/0.0.2'))
-        self.storage.ls = mock.Mock(
-            side_effect=ResponseList(['/mybucket/packages/dummy/0.0.1', '/mybucket/packages/dummy/0.0.2'],
-                                     ['/mybucket/packages/dummy/0.0.1/a.whl'],
-                                     ['/mybucket/packages/dummy/0.0.2/b.whl']))
-        self.storage.split_path = mock.Mock(side_effect=ResponseList(dict(version='0.0.1'),
-                                                                dict(version='0.0.2'),
-                                                                dict(filename='a.whl'),
-                                                                dict(filename='b.whl')))
+        self.storage.get_package_path = mock.Mock(side_effect=lambda n, v=None: path + '/' + v if v else path)
+        listings = {path: ['/mybucket/packages/dummy/0.0.1', '/mybucket/packages/dummy/0.0.2'],
+                    path + '/0.0.1/': ['/mybucket/packages/dummy/0.0.1/a.whl'],
+                    path + '/0.0.2/': ['/mybucket/packages/dummy/0.0.2/b.whl']}
+        self.storage.ls = mock.Mock(side_effect=lambda p, dir_only=False: listings[p])
+        self.storage.split_path = mock.Mock(side_effect=lambda p: dict(zip(['package', 'version', 'filename'],
+                                                                           p.split('/')[3:])))
 
         self.index = PackageIndex(self.storage, 'dummy')
 
     def test_instantiation(self):
-        # Verify calls
-        self.storage.get_package_path.assert_has_calls([mock.call('dummy'),
-                                                   mock.call('dummy', '0.0.1'),
-                                                   mock.call('dummy', '0.0.2')])
-        self.storage.ls.assert_has_calls([mock.call('/mybucket/packages/dummy', dir_only=True),
-                                     mock.call('/mybucket/packages/dummy/0.0.1/'),
-                                     mock.call('/mybucket/packages/dummy/0.0.2/')])
+        # Verify calls: versions are listed, their files are not
+        self.storage.get_package_path.assert_called_once_with('dummy')
+        self.storage.ls.assert_called_once_with('/mybucket/packages/dummy', dir_only=True)
         self.storage.split_path.assert_has_calls([mock.call('/mybucket/packages/dummy/0.0.1'),
-                                             mock.call('/mybucket/packages/dummy/0.0.2'),
-                                             mock.call('/mybucket/packages/dummy/0.0.1/a.whl'),
-                                             mock.call('/mybucket/packages/dummy/0.0.2/b.whl')])
+                                                  mock.call('/mybucket/packages/dummy/0.0.2')])
         assert self.index.name == 'dummy'
         assert self.index.size == len(self.index) == 2
         assert not self.index.empty()
@@ -79,7 +59,7 @@ class TestPackageIndex(unittest.TestCase):
         assert isinstance(p, Package)
         assert p.name == 'dummy'
         assert p.version == '0.0.2'
-        assert p.files == set(['b.whl'])
+        assert p.files == ('b.whl',)
 
     def test_add_version(self):
         s3 = self._storage_mock('dummy', '0.0.3', ['c.whl'])
@@ -87,6 +67,26 @@ class TestPackageIndex(unittest.TestCase):
         self.index.add(p3)
         assert p3 in self.index
         assert self.index.size == 3
+        assert self.index.ordered()[-1] is p3
+        assert self.index.get_version('0.0.3') is p3
+
+    def test_ordering(self):
+        versions = ['1.10.0', '1.9.0', '1.10.0rc1', '1.10.0.post1', '1.0', '1.0.0', '2.0.dev1']
+        index = PackageIndex(self.storage, 'dummy', dict((v, []) for v in versions))
+        assert [p.version for p in index.ordered()][2:] == ['1.9.0', '1.10.0rc1', '1.10.0', '1.10.0.post1', '2.0.dev1']
+        assert index.get_version('1.0').version == '1.0'
+        assert index.get_version('1.0.0').version == '1.0.0'
+        assert index.latest().version == '1.10.0.post1'
+        assert index.latest(prereleases=True).version == '2.0.dev1'
+        assert PackageIndex(self.storage, 'dummy', {'1.0a1': []}).latest().version == '1.0a1'
+        assert PackageIndex(self.storage, 'dummy', {}).latest() is None
+
+    def test_iteration(self):
+        assert not hasattr(self.index, '__dict__')
+        assert [p.version for p in self.index] == ['0.0.1', '0.0.2']
+        assert Package(self.storage, 'dummy', '0.0.1') in self.index
+        assert Package(self.storage, 'dummy', '0.0.3') not in self.index
+        assert Package(self.storage, 'wheel', '0.0.1') not in self.index
 
     def test_add_version_incorrect_name(self):
         s3 = self._storage_mock('wheel', '0.0.3', ['c.whl'])
@@ -101,14 +101,30 @@ class TestPackageIndex(unittest.TestCase):
             self.index.add(p2)
 
     def test_exists(self):
-        self.storage.get_package_path = mock.Mock(return_value='/mybucket/packages/dummy')
-        self.storage.path_exists = mock.Mock(return_value=True)
         assert self.index.exists()
-        self.storage.path_exists.assert_called_with('/mybucket/packages/dummy')
-
-    def test_not_exists(self):
-        self.storage.get_package_path = mock.Mock(return_value='/mybucket/packages/dummy')
-        self.storage.path_exists = mock.Mock(return_value=False)
-        assert not self.index.exists()
-        self.storage.path_exists.assert_called_with('/mybucket/packages/dummy')
+        assert not PackageIndex(self.storage, 'dummy', {}).exists()
+        self.storage.path_exists.assert_not_called()
+        assert self.storage.ls.call_count == 1
+
+    @mock.patch('gaepypi.storage.gcs.listbucket')
+    def test_exists_single_listing(self, listbucket):
+        listbucket.return_value = [mock.Mock(filename='/mybucket/packages/dummy/0.0.1/', is_dir=True),
+                                   mock.Mock(filename='/mybucket/packages/dummy/0.0.2/', is_dir=True)]
+        index = PackageIndex(GCStorage('mybucket'), 'dummy')
+        assert index.exists()
+        assert [p.version for p in index] == ['0.0.1', '0.0.2']
+        assert listbucket.call_count == 1
+        listbucket.assert_called_with('/mybucket/packages/dummy/', delimiter='/')
+
+        listbucket.reset_mock()
+        listbucket.return_value = []
+        assert not PackageIndex(GCStorage('mybucket'), 'other').exists()
+        assert listbucket.call_count == 1
+
+    def test_exists_other_storage(self):
+        other = mock.Mock()
+        other.get_package_path = mock.Mock(return_value='/otherbucket/packages/dummy')
+        other.path_exists = mock.Mock(return_value=False)
+        assert not self.index.exists(other)
+        other.path_exists.assert_called_with('/otherbucket/packages/dummy')
 
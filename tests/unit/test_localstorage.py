@@ -0,0 +1,137 @@
+from gaepypi import LocalStorage, Package, PackageIndex, Catalog
+from gaepypi import NotFoundError
+from contextlib import closing
+from io import BytesIO
+import hashlib
+import shutil
+import tempfile
+import unittest
+import mock
+import os
+
+
+class TestLocalStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.s = LocalStorage(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _path(self, *segments):
+        return '/'.join((self.root,) + segments)
+
+    def test_paths(self):
+        assert self.s.get_packages_path() == self._path('packages')
+        assert self.s.get_package_path('dummy', '0.0.1', 'a.whl') == self._path('packages', 'dummy', '0.0.1', 'a.whl')
+        assert self.s.get_index_path('catalog.json') == self._path('index', 'catalog.json')
+
+    def test_split_path(self):
+        assert self.s.split_path(self._path('packages')) == {}
+        assert self.s.split_path(self._path('packages', 'dummy') + '/') == {'package': 'dummy'}
+        assert self.s.split_path(self._path('packages', 'dummy', '0.0.1', 'a.whl')) == {'package': 'dummy',
+                                                                                      'version': '0.0.1',
+                                                                                      'filename': 'a.whl'}
+
+    def test_write_read(self):
+        path = self.s.get_package_path('dummy', '0.0.1', 'a.whl')
+        digests = self.s.write(path, BytesIO(b'content'))
+        assert digests == {'md5': hashlib.md5(b'content').hexdigest(),
+                           'sha256': hashlib.sha256(b'content').hexdigest(), 'size': 7}
+        with closing(self.s.read(path)) as f:
+            assert f.read() == b'content'
+        with closing(self.s.read(path, offset=3)) as f:
+            assert f.read(2) == b'te'
+            assert f.read() == b'nt'
+            assert f.read() == b''
+        assert b''.join(self.s.iter_read(path, buffer_size=3, offset=1, length=5)) == b'onten'
+        # No temporary files are left behind
+        assert os.listdir(os.path.dirname(path)) == ['a.whl']
+
+    def test_write_replace(self):
+        path = self.s.get_index_path('catalog.json')
+        self.s.write(path, u'{}')
+        self.s.write(path, [b'{"a"', b': {}}'])
+        with closing(self.s.read(path)) as f:
+            assert f.read() == b'{"a": {}}'
+
+    def test_write_failure(self):
+        path = self.s.get_index_path('catalog.json')
+        self.s.write(path, b'old')
+        with mock.patch('gaepypi.storage._replace', side_effect=OSError('failed')):
+            with self.assertRaises(OSError):
+                self.s.write(path, b'new')
+        with closing(self.s.read(path)) as f:
+            assert f.read() == b'old'
+        assert self.s.ls(self.s.get_index_path()) == [path]
+        assert os.listdir(os.path.dirname(path)) == ['catalog.json']
+
+    def test_read_empty(self):
+        path = self.s.get_index_path('empty')
+        self.s.write(path, b'')
+        with closing(self.s.read(path)) as f:
+            assert f.read() == b''
+
+    def test_not_found(self):
+        with self.assertRaises(NotFoundError):
+            self.s.read(self._path('missing'))
+        with self.assertRaises(NotFoundError):
+            self.s.stat(self._path('missing'))
+        with self.assertRaises(NotFoundError):
+            self.s.delete(self._path('missing'))
+
+    def test_ls(self):
+        self.s.write(self.s.get_package_path('dummy', '0.0.1', 'a.whl'), b'a')
+        self.s.write(self.s.get_package_path('dummy', '0.0.1', 'b.whl'), b'b')
+        self.s.write(self.s.get_package_path('dummy', '0.0.2', 'c.whl'), b'c')
+        self.s.write(self.s.get_package_path('dummy', 'notes.txt'), b'')
+        assert self.s.ls(self.s.get_package_path('dummy', '0.0.1')) == [self._path('packages', 'dummy', '0.0.1', 'a.whl'),
+                                                                        self._path('packages', 'dummy', '0.0.1', 'b.whl')]
+        assert self.s.ls(self.s.get_package_path('dummy'), dir_only=True) == [self._path('packages', 'dummy', '0.0.1/'),
+                                                                              self._path('packages', 'dummy', '0.0.2/')]
+        assert len(self.s.ls(self.s.get_package_path('dummy'))) == 3
+        assert self.s.ls(self.s.get_package_path('missing')) == []
+
+    def test_walk_stat(self):
+        self.s.write(self.s.get_package_path('dummy', '0.0.2', 'c.whl'), b'ccc')
+        self.s.write(self.s.get_package_path('dummy', '0.0.1', 'a.whl'), b'a')
+        stats = list(self.s.walk(self.s.get_packages_path()))
+        assert [stat.filename for stat in stats] == [self._path('packages', 'dummy', '0.0.1', 'a.whl'),
+                                                     self._path('packages', 'dummy', '0.0.2', 'c.whl')]
+        assert stats[1].st_size == 3
+        stat = self.s.stat(self._path('packages', 'dummy', '0.0.2', 'c.whl'))
+        assert stat.etag == stats[1].etag
+        assert stat.st_ctime == stats[1].st_ctime
+
+    def test_delete(self):
+        path = self.s.get_package_path('dummy', '0.0.1', 'a.whl')
+        self.s.write(path, b'a')
+        self.s.write(self.s.get_index_path('catalog.json'), b'{}')
+        assert self.s.file_exists(path)
+        assert self.s.path_exists(self.s.get_package_path('dummy'))
+        assert not self.s.empty()
+        self.s.delete(path)
+        assert not self.s.file_exists(path)
+        assert not self.s.path_exists(self.s.get_package_path('dummy'))
+        assert self.s.empty()
+        assert os.path.isdir(self.root)
+
+    def test_package_index(self):
+        self.s.write(self.s.get_package_path('dummy', '0.0.1', 'a.whl'), b'a')
+        self.s.write(self.s.get_package_path('dummy', '0.0.2', 'b.whl'), b'b')
+        index = PackageIndex(self.s, 'dummy')
+        assert [p.version for p in index.ordered()] == ['0.0.1', '0.0.2']
+        assert Package(self.s, 'dummy', '0.0.1').files == ('a.whl',)
+        catalog = Catalog.rebuild(self.s)
+        assert sorted(catalog['dummy']) == ['0.0.1', '0.0.2']
+        assert catalog['dummy']['0.0.1']['a.whl']['size'] == 1
+
+    @mock.patch('gaepypi.maintenance.PageCache')
+    def test_put_file_indexed(self, page_cache):
+        # Without a task queue shared by all instances, uploads are added to the catalog synchronously
+        Package(self.s, 'dummy', '0.0.1').put_file('a.whl', b'a')
+        catalog = Catalog.load(self.s)
+        assert list(catalog['dummy']['0.0.1']) == ['a.whl']
+        assert not self.s.walk(self.s.get_index_path('pending'))
+        page_cache.return_value.bump.assert_called_with()
@@ -0,0 +1,116 @@
+from gaepypi.maintenance import IndexMaintenance, LocalTaskQueue
+from gaepypi import Catalog
+import json
+import mock
+import unittest
+
+
+class TestIndexMaintenance(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = mock.Mock()
+        self.storage.get_index_path = mock.Mock(side_effect=lambda filename: '/mybucket/index/' + filename)
+        self.queue = LocalTaskQueue()
+        self.now = [1000.0]
+        self.maintenance = IndexMaintenance(self.storage, queue=self.queue, clock=lambda: self.now[0])
+        self.page_cache = mock.patch('gaepypi.maintenance.PageCache').start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def test_record(self):
+        self.maintenance.record('Dummy', '0.0.1', 'a.whl', sha256='abc', size=10)
+        path, content = self.storage.write.call_args[0]
+        assert path == '/mybucket/index/pending/dummy/0.0.1/a.whl.json'
+        assert json.loads(content) == {'name': 'Dummy', 'version': '0.0.1', 'filename': 'a.whl', 'sha256': 'abc',
+                                       'size': 10}
+        assert self.queue.pop() == [{'url': '/admin/tasks/index', 'params': {'package': 'dummy'}, 'countdown': 5}]
+        self.page_cache.return_value.bump.assert_called_once_with()
+
+    def test_pending_apply(self):
+        record = {'name': 'dummy', 'version': '0.0.2', 'filename': 'b.whl', 'sha256': 'abc'}
+        self.storage.walk = mock.Mock(return_value=[mock.Mock(filename='/mybucket/index/pending/dummy/0.0.2/b.whl.json')])
+        self.storage.read = mock.Mock(return_value=mock.Mock(read=lambda: json.dumps(record)))
+        records = self.maintenance.pending_records()
+        self.storage.walk.assert_called_once_with('/mybucket/index/pending')
+        catalog = Catalog(self.storage, {'dummy': {'0.0.1': {'a.whl': {}}}})
+        IndexMaintenance.apply(catalog, records)
+        assert catalog == {'dummy': {'0.0.1': {'a.whl': {}}, '0.0.2': {'b.whl': {'sha256': 'abc'}}}}
+        assert records[0][1] == record
+
+    def test_coalesce(self):
+        assert self.maintenance.schedule('dummy')
+        assert not self.maintenance.schedule('Dummy')
+        assert self.maintenance.schedule('other')
+        self.now[0] += 4.9
+        assert not self.maintenance.schedule('dummy')
+        assert len(self.queue.pop()) == 2
+
+        self.now[0] += 0.1
+        assert self.maintenance.schedule('dummy')
+        assert len(self.queue.pop()) == 1
+
+    @mock.patch('gaepypi.maintenance.PageCache')
+    @mock.patch('gaepypi.maintenance.StaticPages')
+    @mock.patch('gaepypi.maintenance.Catalog')
+    def test_process(self, catalog, static_pages, page_cache):
+        records = {'/mybucket/index/pending/dummy/0.0.1/a.whl.json': {'name': 'dummy', 'version': '0.0.1',
+                                                                      'filename': 'a.whl', 'sha256': 'abc'},
+                   '/mybucket/index/pending/dummy/0.0.1/b.whl.json': {'name': 'dummy', 'version': '0.0.1',
+                                                                      'filename': 'b.whl', 'sha256': 'def'}}
+        self.storage.walk = mock.Mock(return_value=[mock.Mock(filename=path) for path in sorted(records)])
+        self.storage.read = mock.Mock(side_effect=lambda path: mock.Mock(read=lambda: json.dumps(records[path])))
+
+        assert self.maintenance.process('dummy') == 2
+        self.storage.walk.assert_called_with('/mybucket/index/pending/dummy')
+        catalog.load.assert_called_once_with(self.storage, schedule_rebuild=False)
+        catalog.load.return_value.add_file.assert_has_calls([mock.call('dummy', '0.0.1', 'a.whl', sha256='abc'),
+                                                             mock.call('dummy', '0.0.1', 'b.whl', sha256='def')])
+        catalog.load.return_value.save.assert_called_once_with()
+        static_pages.return_value.update.assert_called_once_with(catalog.load.return_value, 'dummy')
+        page_cache.return_value.bump.assert_called_once_with()
+        self.storage.delete.assert_has_calls([mock.call(path) for path in sorted(records)])
+
+    @mock.patch('gaepypi.maintenance.Catalog')
+    def test_process_nothing_pending(self, catalog):
+        self.storage.walk = mock.Mock(return_value=[])
+        assert self.maintenance.process('dummy') == 0
+        catalog.load.assert_not_called()
+
+    def test_schedule_rebuild(self):
+        assert self.maintenance.schedule_rebuild()
+        assert not self.maintenance.schedule_rebuild()
+        assert self.queue.pop() == [{'url': '/admin/tasks/index', 'params': {'rebuild': '1'}, 'countdown': 5}]
+
+    @mock.patch('gaepypi.maintenance.PageCache')
+    @mock.patch('gaepypi.maintenance.StaticPages')
+    @mock.patch('gaepypi.maintenance.Catalog')
+    def test_rebuild(self, catalog, static_pages, page_cache):
+        record = {'name': 'dummy', 'version': '0.0.1', 'filename': 'a.whl', 'sha256': 'abc'}
+        path = '/mybucket/index/pending/dummy/0.0.1/a.whl.json'
+        self.storage.walk = mock.Mock(return_value=[mock.Mock(filename=path)])
+        self.storage.read = mock.Mock(return_value=mock.Mock(read=lambda: json.dumps(record)))
+        static_pages.return_value.rebuild.return_value = 4
+
+        assert self.maintenance.rebuild() == (catalog.scan.return_value, 4)
+        self.storage.walk.assert_called_with('/mybucket/index/pending')
+        catalog.scan.return_value.add_file.assert_called_once_with('dummy', '0.0.1', 'a.whl', sha256='abc')
+        catalog.scan.return_value.save.assert_called_once_with()
+        static_pages.return_value.rebuild.assert_called_once_with(catalog.scan.return_value)
+        page_cache.return_value.bump.assert_called_once_with()
+        self.storage.delete.assert_called_once_with(path)
+
+    def test_synchronous(self):
+        self.storage.shared = False
+        maintenance = IndexMaintenance(self.storage)
+        assert maintenance.queue is None
+        maintenance.process = mock.Mock(return_value=1)
+        maintenance.rebuild = mock.Mock()
+        maintenance.record('Dummy', '0.0.1', 'a.whl', sha256='abc')
+        maintenance.process.assert_called_once_with('dummy')
+        assert maintenance.schedule_rebuild()
+        maintenance.rebuild.assert_called_once_with()
+
+    @mock.patch('gaepypi.maintenance.available', return_value=False)
+    def test_no_task_queue(self, available):
+        assert IndexMaintenance(self.storage).queue is None
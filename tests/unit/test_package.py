@@ -1,5 +1,5 @@
 import mock
-from gaepypi import Package, GAEPyPIError
+from gaepypi import Package, Catalog, GAEPyPIError, GCStorage
 import unittest
 
 
@@ -18,17 +18,37 @@ class TestPackage(unittest.TestCase):
         storage = self._storage_mock('dummy', '0.0.1', ['file.txt'])
         p = Package(storage, 'dummy', '0.0.1')
 
-        storage.ls.assert_called_with('/mybucket/packages/dummy/0.0.1/')
-        storage.get_package_path.assert_called_with('dummy', '0.0.1')
+        storage.ls.assert_not_called()
         assert p.name == 'dummy'
         assert p.version == '0.0.1'
         assert 'file.txt' in p.files
         assert len(p.files) == 1
+        storage.ls.assert_called_with('/mybucket/packages/dummy/0.0.1/')
+        storage.get_package_path.assert_called_with('dummy', '0.0.1')
+
+    def test_files_cached(self):
+        storage = self._storage_mock('dummy', '0.0.1', ['file.txt'])
+        p = Package(storage, 'dummy', '0.0.1')
+
+        assert p.files == ('file.txt',)
+        assert p.files == ('file.txt',)
+        assert storage.ls.call_count == 1
+
+    def test_compact(self):
+        storage = self._storage_mock('dummy', '0.0.1', [])
+        p1 = Package(storage, 'Dummy', '0.0.1', ['b.whl', 'a.whl'])
+        p2 = Package(storage, u'dummy', u'0.0.2', set(['c.whl']))
+
+        assert not hasattr(p1, '__dict__')
+        assert p1.files == ('a.whl', 'b.whl')
+        assert p1.name is p2.name
+        assert p1.version_key is Package(storage, 'dummy', '0.0.1').version_key
 
     def test_no_capitals(self):
         storage = self._storage_mock('dummy', '0.0.1', [])
         p = Package(storage, 'Dummy', '0.0.1')
 
+        assert p.empty()
         storage.get_package_path.assert_called_with('dummy', '0.0.1')
         assert p.name == 'dummy'
 
@@ -71,19 +91,44 @@ class TestPackage(unittest.TestCase):
 
     def test_exists(self):
         storage = self._storage_mock('dummy', '0.0.1', ['a.txt'])
-        storage.path_exists = mock.Mock(return_value=True)
         p = Package(storage, 'dummy', '0.0.1')
 
         assert p.exists()
-        storage.path_exists.assert_called_with('/mybucket/packages/dummy/0.0.1')
+        assert p.files == ('a.txt',)
+        assert storage.ls.call_count == 1
+        storage.path_exists.assert_not_called()
 
     def test_not_exists(self):
-        storage = self._storage_mock('dummy', '0.0.1', ['a.txt'])
-        storage.path_exists = mock.Mock(return_value=False)
+        storage = self._storage_mock('dummy', '0.0.1', [])
         p = Package(storage, 'dummy', '0.0.1')
 
         assert not p.exists()
-        storage.path_exists.assert_called_with('/mybucket/packages/dummy/0.0.1')
+        assert not Package(storage, 'dummy', '0.0.2', []).exists()
+        assert storage.ls.call_count == 1
+        storage.path_exists.assert_not_called()
+
+    @mock.patch('gaepypi.storage.gcs.listbucket')
+    def test_exists_single_listing(self, listbucket):
+        listbucket.return_value = [mock.Mock(filename='/mybucket/packages/dummy/0.0.1/a.txt', is_dir=False)]
+        p = Package(GCStorage('mybucket'), 'dummy', '0.0.1')
+        assert p.exists()
+        assert p.files == ('a.txt',)
+        assert listbucket.call_count == 1
+        listbucket.assert_called_with('/mybucket/packages/dummy/0.0.1/', delimiter='/')
+
+        listbucket.reset_mock()
+        listbucket.return_value = []
+        assert not Package(GCStorage('mybucket'), 'dummy', '0.0.2').exists()
+        assert listbucket.call_count == 1
+
+    def test_exists_other_storage(self):
+        storage = self._storage_mock('dummy', '0.0.1', ['a.txt'])
+        other = self._storage_mock('dummy', '0.0.1', [])
+        other.path_exists = mock.Mock(return_value=False)
+        p = Package(storage, 'dummy', '0.0.1')
+
+        assert not p.exists(other)
+        other.path_exists.assert_called_with('/mybucket/packages/dummy/0.0.1')
 
     def test_empty(self):
         storage = self._storage_mock('dummy', '0.0.1', ['a.txt'])
@@ -117,6 +162,41 @@ class TestPackage(unittest.TestCase):
         storage.read.assert_called_with('/mybucket/packages/dummy/0.0.1/a.txt')
         storage.get_package_path.assert_called_with('dummy', '0.0.1', 'a.txt')
 
+    def test_iterfile(self):
+        storage = self._storage_mock('dummy', '0.0.1', ['a.txt'])
+        p = Package(storage, 'dummy', '0.0.1')
+        storage.get_package_path = mock.Mock(return_value='/mybucket/packages/dummy/0.0.1/a.txt')
+        storage.iter_read = mock.Mock(return_value=iter(['con', 'tent']))
+
+        assert list(p.iter_file('a.txt', 3)) == ['con', 'tent']
+        storage.iter_read.assert_called_with('/mybucket/packages/dummy/0.0.1/a.txt', buffer_size=3,
+                                             offset=0, length=None, etag=None)
+        p.iter_file('a.txt', 3, offset=2, length=5, etag='e1')
+        storage.iter_read.assert_called_with('/mybucket/packages/dummy/0.0.1/a.txt', buffer_size=3,
+                                             offset=2, length=5, etag='e1')
+        with self.assertRaises(GAEPyPIError):
+            p.iter_file('b.txt', 3)
+
+    def test_statfile(self):
+        storage = self._storage_mock('dummy', '0.0.1', ['a.txt'])
+        p = Package(storage, 'dummy', '0.0.1')
+        storage.get_package_path = mock.Mock(return_value='/mybucket/packages/dummy/0.0.1/a.txt')
+        storage.stat = mock.Mock(return_value='stat')
+
+        assert p.stat_file('a.txt') == 'stat'
+        storage.stat.assert_called_with('/mybucket/packages/dummy/0.0.1/a.txt')
+
+    def test_fileurl(self):
+        storage = self._storage_mock('dummy', '0.0.1', ['a.txt'])
+        p = Package(storage, 'dummy', '0.0.1')
+        storage.get_package_path = mock.Mock(return_value='/mybucket/packages/dummy/0.0.1/a.txt')
+        storage.signed_url = mock.Mock(return_value='https://signed')
+
+        assert p.file_url('a.txt', 300) == 'https://signed'
+        storage.signed_url.assert_called_with('/mybucket/packages/dummy/0.0.1/a.txt', 300)
+        with self.assertRaises(GAEPyPIError):
+            p.file_url('b.txt', 300)
+
     def test_putfile_exists(self):
         storage = self._storage_mock('dummy', '0.0.1', ['a.txt'])
         p = Package(storage, 'dummy', '0.0.1')
@@ -124,13 +204,61 @@ class TestPackage(unittest.TestCase):
             with p.put_file('a.txt', 'content') as f:
                 pass
 
-    def test_putfile(self):
+    @mock.patch('gaepypi.package.time.time', return_value=1500000000.0)
+    @mock.patch('gaepypi.maintenance.IndexMaintenance')
+    def test_putfile(self, maintenance, now):
         storage = self._storage_mock('dummy', '0.0.1', ['a.txt'])
         p = Package(storage, 'dummy', '0.0.1')
-        storage.write = mock.Mock()
+        digests = {'md5': '456', 'sha256': '123', 'size': 7}
+        storage.write = mock.Mock(return_value=digests)
         storage.get_package_path = mock.Mock(return_value='/mybucket/packages/dummy/0.0.1/b.txt')
-        p.put_file('b.txt', 'content')
+        assert p.put_file('b.txt', 'content') == digests
 
         assert 'b.txt' in p.files
+        assert storage.ls.call_count == 1
         storage.get_package_path.assert_called_with('dummy', '0.0.1', 'b.txt')
-        storage.write.assert_called_with('/mybucket/packages/dummy/0.0.1/b.txt', 'content')
\ No newline at end of file
+        storage.write.assert_called_with('/mybucket/packages/dummy/0.0.1/b.txt', 'content')
+        maintenance.assert_called_with(storage)
+        maintenance.return_value.record.assert_called_with('dummy', '0.0.1', 'b.txt', sha256='123', size=7,
+                                                           upload_time=1500000000.0)
+
+    @mock.patch('gaepypi.maintenance.IndexMaintenance')
+    def test_putfiles(self, maintenance):
+        storage = self._storage_mock('dummy', '0.0.1', ['a.txt'])
+        storage.get_package_path = mock.Mock(side_effect=lambda n, v=None, f=None: '/'.join(filter(None, [n, v, f])))
+        storage.map = mock.Mock(side_effect=lambda func, items, retries=None: [func(item) for item in items])
+        p = Package(storage, 'dummy', '0.0.1', ['a.txt'])
+
+        def write(path, content):
+            if content == 'broken':
+                raise IOError('write failed')
+            return {'md5': 'md5:' + content, 'sha256': 'sha:' + content, 'size': len(content)}
+        storage.write = mock.Mock(side_effect=write)
+
+        results = p.put_files([('b.txt', 'b'), ('a.txt', 'a'), ('c.txt', 'broken'), ('b.txt', 'b2'), ('d.txt', 'd')])
+        assert [(filename, digests and digests['sha256']) for filename, digests, _ in results] == [
+            ('b.txt', 'sha:b'), ('a.txt', None), ('c.txt', None), ('b.txt', None), ('d.txt', 'sha:d')]
+        assert [error is None for _, _, error in results] == [True, False, False, False, True]
+        assert results[2][2] == 'write failed'
+        assert storage.map.call_count == 1
+        # Writes are not retried
+        assert storage.map.call_args[1]['retries'] == 0
+        assert storage.write.call_count == 3
+        assert p.files == ('a.txt', 'b.txt', 'd.txt')
+        assert maintenance.return_value.record.call_count == 2
+
+    def test_instantiation_files(self):
+        storage = self._storage_mock('dummy', '0.0.1', [])
+        p = Package(storage, 'dummy', '0.0.1', ['a.txt'])
+
+        storage.ls.assert_not_called()
+        assert p.files == ('a.txt',)
+
+    def test_from_catalog(self):
+        storage = self._storage_mock('dummy', '0.0.1', [])
+        catalog = Catalog(storage, {'dummy': {'0.0.1': ['a.txt']}})
+        p = Package.from_catalog(storage, 'Dummy', '0.0.1', catalog=catalog)
+
+        storage.ls.assert_not_called()
+        assert p.name == 'dummy'
+        assert p.files == ('a.txt',)
\ No newline at end of file
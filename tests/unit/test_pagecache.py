@@ -0,0 +1,77 @@
+from gaepypi import pagecache
+from gaepypi.pagecache import PageCache, LocalCacheClient
+from google.appengine.ext import testbed
+import unittest
+import mock
+
+
+class TestPageCache(unittest.TestCase):
+
+    def setUp(self):
+        self.client = LocalCacheClient()
+        self.cache = PageCache(self.client)
+
+    def test_generation(self):
+        generation = self.cache.generation()
+        assert generation is not None
+        assert self.cache.generation() == generation
+
+        self.cache.bump()
+        assert self.cache.generation() == generation + 1
+
+    def test_get_set(self):
+        generation = self.cache.generation()
+        assert self.cache.get('/pypi/', generation) is None
+        self.cache.set('/pypi/', generation, ('etag', 'body'))
+        assert self.cache.get('/pypi/', generation) == ('etag', 'body')
+        assert self.cache.get('/packages', generation) is None
+
+    def test_bump_invalidates(self):
+        generation = self.cache.generation()
+        self.cache.set('/pypi/', generation, ('etag', 'body'))
+        self.cache.bump()
+        assert self.cache.get('/pypi/', self.cache.generation()) is None
+
+    def test_unavailable(self):
+        self.client.get = lambda key: None
+        self.client.incr = lambda key, delta=1, initial_value=None: None
+        generation = self.cache.generation()
+        assert generation is None
+        self.cache.set('/pypi/', generation, ('etag', 'body'))
+        assert self.cache.get('/pypi/', generation) is None
+
+
+class TestPageCacheFallback(unittest.TestCase):
+
+    @mock.patch('gaepypi.pagecache.available', return_value=False)
+    def test_local(self, available):
+        # Without memcache, pages are cached in the process, and shared by all page caches
+        cache = PageCache()
+        generation = cache.generation()
+        cache.set('/pypi/', generation, ('etag', 'body'))
+        assert cache.client is pagecache._local_client
+        assert PageCache().get('/pypi/', generation) == ('etag', 'body')
+        PageCache().bump()
+        assert cache.generation() == generation + 1
+
+
+class TestPageCacheMemcache(unittest.TestCase):
+
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_memcache_stub()
+        self.cache = PageCache()
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_get_set(self):
+        generation = self.cache.generation()
+        assert self.cache.set('/pypi/', generation, ('etag', 'body'))
+        assert self.cache.get('/pypi/', generation) == ('etag', 'body')
+
+    def test_too_large(self):
+        generation = self.cache.generation()
+        assert not self.cache.set('/pypi/', generation, ('etag', 'x' * 1200000))
+        assert self.cache.get('/pypi/', generation) is None
@@ -0,0 +1,28 @@
+from gaepypi._pep440 import version_key, is_prerelease
+import unittest
+
+
+class TestPep440(unittest.TestCase):
+
+    def test_ordering(self):
+        versions = ['0.9', '1.0.dev0', '1.0a1', '1.0a2.dev1', '1.0a2', '1.0b1', '1.0rc1', '1.0', '1.0+local.abc',
+                    '1.0+local.1', '1.0.post1.dev0', '1.0.post1', '1.1', '1.9.0', '1.10.0', '1!0.1']
+        assert sorted(reversed(versions), key=version_key) == versions
+
+    def test_equivalence(self):
+        assert version_key('1.0') == version_key('1.0.0') == version_key('v1.0')
+        assert version_key('1.0alpha1') == version_key('1.0a1') == version_key('1.0-a1')
+        assert version_key('1.0-1') == version_key('1.0.post1') == version_key('1.0rev1')
+        assert version_key('1.0c1') == version_key('1.0rc1')
+
+    def test_invalid(self):
+        assert version_key('latest-build') < version_key('0.0.1')
+        assert version_key('abc') < version_key('abd')
+
+    def test_is_prerelease(self):
+        assert is_prerelease(version_key('1.0rc1'))
+        assert is_prerelease(version_key('1.0.dev3'))
+        assert is_prerelease(version_key('1.0.post1.dev0'))
+        assert not is_prerelease(version_key('1.0'))
+        assert not is_prerelease(version_key('1.0.post1'))
+        assert not is_prerelease(version_key('nightly'))
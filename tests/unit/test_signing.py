@@ -0,0 +1,51 @@
+from gaepypi._signing import LocalSigner, signed_url, string_to_sign, MAX_EXPIRATION
+from six.moves.urllib.parse import urlsplit, parse_qsl
+import binascii
+import calendar
+import time
+import unittest
+
+
+class TestSigning(unittest.TestCase):
+
+    def setUp(self):
+        self.signer = LocalSigner(b'secret', 'account@project.iam.gserviceaccount.com')
+        self.now = calendar.timegm((2017, 6, 1, 12, 30, 0))
+
+    def _parse(self, url):
+        parts = urlsplit(url)
+        return parts, dict(parse_qsl(parts.query))
+
+    def test_url(self):
+        parts, query = self._parse(signed_url('/mybucket/packages/dummy/0.0.1/a.whl', 300, self.signer, now=self.now))
+        assert parts.scheme == 'https'
+        assert parts.netloc == 'storage.googleapis.com'
+        assert parts.path == '/mybucket/packages/dummy/0.0.1/a.whl'
+        assert query['X-Goog-Algorithm'] == 'GOOG4-RSA-SHA256'
+        assert query['X-Goog-Credential'] == \
+            'account@project.iam.gserviceaccount.com/20170601/auto/storage/goog4_request'
+        assert query['X-Goog-Date'] == '20170601T123000Z'
+        assert query['X-Goog-Expires'] == '300'
+        assert query['X-Goog-SignedHeaders'] == 'host'
+
+    def test_signature(self):
+        url = signed_url('/mybucket/packages/dummy/0.0.1/a b+c.whl', 300, self.signer, now=self.now)
+        parts, query = self._parse(url)
+        assert parts.path == '/mybucket/packages/dummy/0.0.1/a%20b%2Bc.whl'
+        signature = binascii.unhexlify(query.pop('X-Goog-Signature'))
+        blob = string_to_sign('/mybucket/packages/dummy/0.0.1/a b+c.whl', list(query.items()),
+                              time.gmtime(self.now))
+        assert self.signer.verify(blob, signature)
+        assert not LocalSigner(b'other').verify(blob, signature)
+
+    def test_string_to_sign(self):
+        blob = string_to_sign('/mybucket/a.whl', [('X-Goog-Expires', '300')], time.gmtime(self.now))
+        lines = blob.decode('utf-8').split('\n')
+        assert lines[:3] == ['GOOG4-RSA-SHA256', '20170601T123000Z', '20170601/auto/storage/goog4_request']
+        assert len(lines[3]) == 64
+
+    def test_expiration_bounds(self):
+        _, query = self._parse(signed_url('/mybucket/a.whl', 10 ** 9, self.signer, now=self.now))
+        assert query['X-Goog-Expires'] == str(MAX_EXPIRATION)
+        _, query = self._parse(signed_url('/mybucket/a.whl', 0, self.signer, now=self.now))
+        assert query['X-Goog-Expires'] == '1'
@@ -0,0 +1,56 @@
+from gaepypi import Catalog, StaticPages
+from gaepypi.templates import templates_checksum
+from gaepypi import NotFoundError
+import mock
+import unittest
+
+
+class TestStaticPages(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = mock.Mock()
+        self.storage.get_index_path = mock.Mock(side_effect=lambda filename: '/mybucket/index/' + filename)
+        self.storage.to_html = mock.Mock(side_effect=lambda full_index, catalog: 'full' if full_index else 'names')
+        self.storage.empty = mock.Mock(side_effect=lambda catalog: len(catalog) == 0)
+        self.catalog = Catalog(self.storage, {'dummy': {'0.0.1': {'a.whl': {}}}})
+        self.pages = StaticPages(self.storage)
+        self.prefix = '/mybucket/index/pages/{0}/'.format(templates_checksum())
+
+    def test_render(self):
+        assert self.pages.render(self.catalog, 'pypi') == 'full'
+        assert self.pages.render(self.catalog, 'packages') == 'names'
+        assert self.pages.render(Catalog(self.storage), 'packages').startswith('Nothing to see here')
+        assert '/packages/dummy/0.0.1/a.whl' in self.pages.render(self.catalog, 'pypi/dummy')
+        assert '/packages/dummy/0.0.1"' in self.pages.render(self.catalog, 'packages/dummy')
+        assert self.pages.render(self.catalog, 'pypi/other') is None
+
+    def test_read(self):
+        self.storage.read = mock.Mock(return_value=mock.Mock(read=mock.Mock(return_value=b'<a>')))
+        assert self.pages.read('pypi/dummy') == '<a>'
+        self.storage.read.assert_called_with(self.prefix + 'pypi/dummy.html')
+
+        self.storage.read = mock.Mock(side_effect=NotFoundError)
+        assert self.pages.read('pypi') is None
+
+    def test_update(self):
+        assert self.pages.update(self.catalog, 'Dummy', 'other') == 4
+        written = dict(c[0] for c in self.storage.write.call_args_list)
+        assert sorted(written) == [self.prefix + 'packages.html', self.prefix + 'packages/dummy.html',
+                                   self.prefix + 'pypi.html', self.prefix + 'pypi/dummy.html']
+        assert written[self.prefix + 'pypi.html'] == 'full'
+
+    def test_rebuild(self):
+        self.storage.walk = mock.Mock(return_value=[mock.Mock(filename=self.prefix + 'pypi.html'),
+                                                    mock.Mock(filename=self.prefix + 'pypi/dummy.html'),
+                                                    mock.Mock(filename=self.prefix + 'pypi/removed.html')])
+        assert self.pages.rebuild(self.catalog) == 4
+        # Only the pages of the current templates are walked, those of other versions may still be served
+        self.storage.walk.assert_called_with(self.prefix.rstrip('/'))
+        self.storage.delete.assert_called_once_with(self.prefix + 'pypi/removed.html')
+
+    def test_deployment(self):
+        # Pages are shared by deployments of the same templates
+        with mock.patch.dict('os.environ', {'CURRENT_VERSION_ID': '2.4001'}):
+            path = self.pages.path('pypi')
+        with mock.patch.dict('os.environ', {'CURRENT_VERSION_ID': '3.4002'}):
+            assert self.pages.path('pypi') == path
@@ -0,0 +1,64 @@
+from gaepypi import templates
+from gaepypi.templates import compile_templates, create_environment, CompiledLoader
+import jinja2
+import tempfile
+import unittest
+import shutil
+import json
+import mock
+import os
+
+
+class TestTemplates(unittest.TestCase):
+
+    def setUp(self):
+        self.target = tempfile.mkdtemp()
+        self.context = {'files': [{'name': 'dummy', 'version': '0.1', 'filename': 'dummy-0.1.whl', 'sha256': 'ab'}]}
+
+    def tearDown(self):
+        shutil.rmtree(self.target)
+
+    def _manifest(self):
+        with open(os.path.join(self.target, 'manifest.json')) as f:
+            return json.load(f)
+
+    def test_compile(self):
+        assert compile_templates(self.target) == 5
+        assert sorted(self._manifest()['checksums']) == sorted(os.listdir(templates.TEMPLATES_PATH))
+        assert len([name for name in os.listdir(self.target) if name.endswith('.py')]) == 5
+
+    def test_compiled_render(self):
+        compile_templates(self.target)
+        compiled = create_environment(self.target)
+        source = create_environment(None)
+        with mock.patch.object(jinja2.FileSystemLoader, 'get_source') as get_source:
+            body = compiled.get_template('simple-project.html.j2').render(self.context)
+            get_source.assert_not_called()
+        assert body == source.get_template('simple-project.html.j2').render(self.context)
+        assert 'dummy-0.1.whl#sha256=ab' in body
+
+    def test_changed_source(self):
+        compile_templates(self.target)
+        loader = CompiledLoader(self.target)
+        loader.checksums['simple-project.html.j2'] = 'outdated'
+        with self.assertRaises(jinja2.TemplateNotFound):
+            loader.load(create_environment(None), 'simple-project.html.j2')
+        environment = create_environment(self.target)
+        environment.loader.loaders[0] = loader
+        assert 'dummy-0.1.whl' in environment.get_template('simple-project.html.j2').render(self.context)
+
+    def test_other_compiler(self):
+        compile_templates(self.target)
+        with mock.patch('gaepypi.templates._compiler', return_value='0.0-py0'):
+            assert CompiledLoader(self.target).checksums == {}
+
+    def test_not_compiled(self):
+        assert isinstance(create_environment(self.target).loader, jinja2.FileSystemLoader)
+
+    def test_templates_checksum(self):
+        checksum = templates.templates_checksum()
+        assert checksum.startswith(templates.__version__ + '-')
+        with mock.patch.object(templates, '_templates_checksum', None), \
+                mock.patch.object(templates, '_checksum', side_effect=lambda name: 'changed'):
+            assert templates.templates_checksum() != checksum
+        assert templates.templates_checksum() == checksum